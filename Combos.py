@@ -1,5 +1,6 @@
 from Deck import Card, Deck
 from collections import Counter
+from evaluator import evaluate, hand_type, category, STRAIGHT, FLUSH, FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH, TWO_PAIR, TREE_OF_A_KIND, PAIR
 
 HAND_STRENGHT = {
     'STRAIGHT_FLUSH' : 10,
@@ -15,281 +16,105 @@ HAND_STRENGHT = {
 
 class Combo:
 
-    def __init__(self, hand):
+    def __init__(self, hand, rank = None):
         self.hand = hand
-        self.suits = Counter([c.suit for c in hand])
-        self.numbers = Counter([c.number for c in hand])
-        self.best_hand = []
-        self.kickers = []
-        self.type = None
-        self.criterion = None
-        self.resolve()
+        self.rank = evaluate([c.code for c in hand]) if rank is None else rank
+        self.type = hand_type(self.rank)
+        self._resolved = None
 
     def __repr__(self):
         return f"{self.type} crit: {self.criterion} kickers: {self.kickers} -- {self.best_hand}"
 
-    def resolve(self):
-        
-        detected = self.detectStraightFlush()
-        if not detected:
-            detected = self.detectFourOfAKind()
-        if not detected:
-            detected = self.detectFullHouse()
-        if not detected:
-            detected = self.detectFlush()
-        if not detected:
-            detected = self.detectTreeOfAKind()
-        if not detected:
-            detected = self.detectStraight()
-        if not detected:
-            detected = self.detectTwoPair()
-        if not detected:
-            detected = self.detectPair()
-        if not detected:
-            self.HighCard()
-
-    def detectStraightFlush(self):
-
-        if len(self.hand) < 5:
-            return False
-        
-        suit, amount = self.suits.most_common(1)[0]
-
-        if amount < 5:
-            return False
-
-        ordered = sorted([c for c in self.hand if c.suit == suit], reverse=True)
-        combo = 1
-        highest = ordered[0].number
-        previous = ordered[0].number
-        best_hand = [ordered[0]]
-
-        for card in ordered[1:]:
-            if card.number == previous - 1 or (previous == 2 and combo == 4 and card.number == 14):
-                combo += 1
-                best_hand.append(card)
-                if combo == 5:
-                    break
-            elif card.number == previous:
-                continue
-            else:
-                highest = card.number
-                combo = 1
-                best_hand = [card]
-            previous = card.number
-
-        if combo < 5:
-            return False
-
-        self.best_hand = best_hand
-        self.kickers = []
-        self.type = 'STRAIGHT_FLUSH'
-        self.criterion= highest
-
-        return True
-            
-    def detectFlush(self):
-
-        if len(self.hand) < 5:
-            return False
-
-        suit, amount = self.suits.most_common(1)[0]
-
-        if amount < 5:
-            return False
-
-        best_hand = sorted([c for c in self.hand if c.suit == suit], reverse=True)[:5]
-
-        self.best_hand = best_hand
-        self.kickers = best_hand
-        self.type = 'FLUSH'
-        self.criterion = 0 
-
-        return True
-
-    def detectFullHouse(self):
-        
-        if len(self.hand) < 5:
-            return False
-
-        triple, double = self.numbers.most_common(2)
-        number_3, amount_3 = triple
-        number_2, amount_2 = double
-
-        if amount_3 < 3 or amount_2 < 2:
-            return False
-        
-        triple = max([num for num in self.numbers if self.numbers[num] >= 3])
-        double = max([num for num in self.numbers if (self.numbers[num] >= 2 and num != triple)])
-        best_hand = [c for c in self.hand if c.number == triple][:3] + [c for c in self.hand if c.number == double][:2]
-        
-        self.best_hand = best_hand,
-        self.kickers = [],
-        self.type = 'FULL_HOUSE'
-        self.criterion = triple * 100 + double 
-
-        return True
-
-    def detectTwoPair(self):
-
-        if len(self.hand) < 4:
-            return False
-
-        pair_1, pair_2 = self.numbers.most_common(2)
-        number_p1, amount_p1 = pair_1
-        number_p2, amount_p2 = pair_2
-
-        if amount_p1 < 2 or amount_p2 < 2:
-            return False
-        
-        num_pair_1 = max([num for num in self.numbers if self.numbers[num] >= 2])
-        num_pair_2 = max([num for num in self.numbers if (self.numbers[num] >= 2 and num != num_pair_1)])
-
-        kicker =[max([c for c in self.hand if c.number not in [pair_1, pair_2]])]
-        best_hand = [c for c in self.hand if c.number == num_pair_1][:2] + [c for c in self.hand if c.number == num_pair_2][:2] + kicker
-
-        self.best_hand = best_hand
-        self.kickers = kicker
-        self.type = 'TWO_PAIR'
-        self.criterion = num_pair_1 * 100 + num_pair_2 
-
-        return True
-
-    def detectFourOfAKind(self):
+    # The cards behind the rank are only worked out when asked for; comparing
+    # hands only ever needs the rank
+    @property
+    def suits(self):
+        return Counter([c.suit for c in self.hand])
 
-        if len(self.hand) < 4:
-            return False
+    @property
+    def numbers(self):
+        return Counter([c.number for c in self.hand])
 
-        number, amount = self.numbers.most_common(1)[0]
+    @property
+    def best_hand(self):
+        return self.resolve()[0]
 
-        if amount < 4:
-            return False
+    @property
+    def kickers(self):
+        return self.resolve()[1]
 
-        kickers = sorted([c for c in self.hand if c.number != number], reverse=True)[:1]
-        best_hand =  [c for c in self.hand if c.number == number] + kickers
+    @property
+    def criterion(self):
+        return self.resolve()[2]
 
-        self.best_hand = best_hand
-        self.kickers = kickers
-        self.type = 'FOUR_OF_A_KIND'
-        self.criterion = number 
-
-        return True
-
-    def detectTreeOfAKind(self):
-
-        if len(self.hand) < 3:
-            return False
-
-        number, amount = self.numbers.most_common(1)[0]
-
-        if amount < 3:
-            return False
-
-        kickers = sorted([c for c in self.hand if c.number != number], reverse=True)[:2]
-
-        best_hand =  [c for c in self.hand if c.number == number][:3] + kickers
-
-        self.best_hand = best_hand
-        self.kickers = kickers
-        self.type = 'TREE_OF_A_KIND'
-        self.criterion = number 
-
-        return True
-    
-    def detectPair(self):
-
-        if len(self.hand) < 2:
-            return False
-
-        number, amount = self.numbers.most_common(1)[0]
-
-        if amount < 2:
-            return False
-
-        kickers = sorted([c for c in self.hand if c.number != number], reverse=True)[:3] 
-        best_hand = [c for c in self.hand if c.number == number][:2] + kickers
-
-        self.best_hand = best_hand
-        self.kickers = kickers
-        self.type = 'PAIR'
-        self.criterion = number 
-
-        return True
-
-    def detectStraight(self):
+    def resolve(self):
 
-        if len(self.hand) < 5:
-            return False
+        if self._resolved is not None:
+            return self._resolved
 
+        # Card numbers are the rank nibbles plus two, most significant first
+        kind = category(self.rank)
+        top = (self.rank >> 16 & 15) + 2
+        second = (self.rank >> 12 & 15) + 2
         ordered = sorted(self.hand, reverse=True)
-        combo = 1
-        highest = ordered[0].number
-        previous = ordered[0].number
-        best_hand = [ordered[0]]
-
-        for card in ordered[1:]:
-            if card.number == previous - 1 or (previous == 2 and combo == 4 and card.number == 14):
-                combo += 1
-                best_hand.append(card)
-                if combo == 5:
-                    break
-            elif card.number == previous:
-                continue
-            else:
-                highest = card.number
-                combo = 1
-                best_hand = [card]
-            previous = card.number
-
-        if combo < 5:
-            return False
-
-        self.best_hand = best_hand
-        self.kickers = []
-        self.type = 'STRAIGHT'
-        self.criterion = highest 
 
-        return True
-
-    def HighCard(self):
-
-        kickers = sorted(self.hand, reverse=True)[:5]
-
-        self.best_hand = kickers
-        self.kickers = kickers
-        self.type = 'HIGH_CARD'
-        self.criterion = 0 
+        def of(number, cards=ordered):
+            return [c for c in cards if c.number == number]
+
+        def other(*numbers):
+            return [c for c in ordered if c.number not in numbers]
+
+        if kind in (STRAIGHT, STRAIGHT_FLUSH):
+            # A wheel is five high, its ace plays as the lowest card
+            cards = ordered
+            if kind == STRAIGHT_FLUSH:
+                suit = self.suits.most_common(1)[0][0]
+                cards = [c for c in ordered if c.suit == suit]
+            numbers = [n if n > 1 else 14 for n in range(top, top - 5, -1)]
+            best_hand = [of(n, cards)[0] for n in numbers]
+            kickers = []
+            criterion = top
+        elif kind == FLUSH:
+            suit = self.suits.most_common(1)[0][0]
+            best_hand = [c for c in ordered if c.suit == suit][:5]
+            kickers = best_hand
+            criterion = 0
+        elif kind == FOUR_OF_A_KIND:
+            kickers = other(top)[:1]
+            best_hand = of(top) + kickers
+            criterion = top
+        elif kind == FULL_HOUSE:
+            best_hand = of(top)[:3] + of(second)[:2]
+            kickers = []
+            criterion = top * 100 + second
+        elif kind == TREE_OF_A_KIND:
+            kickers = other(top)[:2]
+            best_hand = of(top)[:3] + kickers
+            criterion = top
+        elif kind == TWO_PAIR:
+            kickers = other(top, second)[:1]
+            best_hand = of(top)[:2] + of(second)[:2] + kickers
+            criterion = top * 100 + second
+        elif kind == PAIR:
+            kickers = other(top)[:3]
+            best_hand = of(top)[:2] + kickers
+            criterion = top
+        else:
+            kickers = ordered[:5]
+            best_hand = kickers
+            criterion = 0
 
-        return True
+        self._resolved = (best_hand, kickers, criterion)
+        return self._resolved
 
     def __gt__(self, other_hand):
+        return self.rank > other_hand.rank
 
-        if HAND_STRENGHT[self.type] > HAND_STRENGHT[other_hand.type]:
-            return True
-        elif HAND_STRENGHT[self.type] == HAND_STRENGHT[other_hand.type]:
-            if self.criterion > other_hand.criterion:
-                return True
-            elif self.criterion == other_hand.criterion:
-                for i in range(len(self.kickers)):
-                    if self.kickers[i] != other_hand.kickers[i]:
-                        return self.kickers[i] > other_hand.kickers[i]
-                return False
-            else:
-                return False
-        else:
-            return False
-
-        return sel
+    def __lt__(self, other_hand):
+        return self.rank < other_hand.rank
 
     def __eq__(self, other_hand):
-        sameType = HAND_STRENGHT[self.type] == HAND_STRENGHT[other_hand.type]
-        if not sameType:
-            return False
-        sameCriteria = self.criterion == other_hand.criterion
-        if not sameCriteria:
-            return False
-        sameKickers = all([self.kickers[i] == other_hand.kickers[i] for i in range(len(self.kickers))])
-        return sameKickers
+        return self.rank == other_hand.rank
 
 
 if __name__ == '__main__':
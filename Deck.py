@@ -1,9 +1,29 @@
-from random import shuffle
+import random
 
 
 num_to_repr = { 14: 'A', 11: 'J', 12: 'Q', 13: 'K', 10 : 'T' }
 suit_to_repr = { 'S': '♠', 'H' : '♥', 'D' : '♦' , 'C' : '♣' }
 
+# Card codes run by number then suit:
+# code = (number - 2) * 4 + SUITS.index(suit), so 0 = 2H and 51 = AS
+SUITS = ['H', 'D', 'C', 'S']
+ORDERED = tuple(range(52))
+
+def card_code(number, suit):
+    return (number - 2) * 4 + SUITS.index(suit)
+
+def code_to_card(code):
+    return Card((code >> 2) + 2, SUITS[code & 3])
+
+# One shared Card per code, built on first use; cards are never mutated so
+# every deck hands out the same objects
+CARDS = []
+
+def card(code):
+    if not CARDS:
+        CARDS.extend(code_to_card(c) for c in range(52))
+    return CARDS[code]
+
 class Card:
 
     def __init__(self, number, suit):
@@ -14,6 +34,9 @@ class Card:
         # Suit = [H, D, C, S]
         self.suit = suit
 
+        # Integer code used by the evaluator
+        self.code = card_code(number, suit)
+
     def get_number(self):
         return num_to_repr[self.number] if self.number in num_to_repr else self.number
 
@@ -31,24 +54,48 @@ class Card:
 
 class Deck:
 
-    def __init__(self):
-        self.cards = []
+    def __init__(self, rng = None):
 
-        for n in range(2, 15):
-            for s in ['H', 'D', 'C', 'S']:
-                card = Card(n,s)
-                self.cards.append(card)
+        # A single list of card codes reused for every hand: shuffle() puts
+        # it back in order and shuffles it in place, draws advance a cursor.
+        # rng is anything with a shuffle method, such as a numpy Generator
+        # or a random.Random; by default the random module is used.
+        self.codes = list(range(52))
+        self.cursor = 0
+        self.rng = random if rng is None else rng
+        card(0)
 
     def shuffle(self):
-        shuffle(self.cards)
+        # Starting from the ordered deck makes each deal depend only on the
+        # rng state, not on what earlier hands left behind
+        self.codes[:] = ORDERED
+        self.cursor = 0
+        self.rng.shuffle(self.codes)
+
+    def drawOneCode(self):
+        code = self.codes[self.cursor]
+        self.cursor += 1
+        return code
+
+    def drawCodes(self, N):
+        if self.cursor + N > 52:
+            raise IndexError('Not enough cards left in the deck.')
+        codes = self.codes[self.cursor:self.cursor + N]
+        self.cursor += N
+        return codes
 
     def drawOne(self):
-        return self.cards.pop(0)
-    
+        return CARDS[self.drawOneCode()]
+
     def draw(self, N):
-        drawn_cards = self.cards[:N]
-        self.cards = self.cards[N:]
-        return drawn_cards
+        return [CARDS[c] for c in self.drawCodes(N)]
+
+    def dealt(self):
+        # Codes dealt since the last shuffle, in dealing order
+        return self.codes[:self.cursor]
+
+    def __len__(self):
+        return 52 - self.cursor
 
 
 if __name__ == "__main__":
@@ -1,12 +1,14 @@
 from Deck import Deck
 from Player import Player, RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
-from Combos import Combo
+from seeding import seed_table
+from settlement import settle_pots
+from table_state import TableState
 from utils import print_debug
 
 
 class PokerEnv:
 
-    def __init__(self, players, stack, small_blind):
+    def __init__(self, players, stack, small_blind, debug=False, seed=None, recorder=None, profiler=None):
         self.state = 'ZERO'
         self.initial_stack = stack
         self.all_players = players
@@ -17,10 +19,15 @@ class PokerEnv:
         self.dealer = 0
         self.pot = 0
         self.highest_bet = self.big_blind
-        self.deck = None
+        # With a seed the deck and the players get their own streams of it
+        self.deck = Deck(None if seed is None else seed_table(seed, self.all_players))
+        self.table_state = TableState()
         self.possibleActions = ['CHECK', 'BET', 'CALL', 'FOLD']
+        # Optional hand_history.HandHistoryRecorder and instrumentation.Profiler
+        self.recorder = recorder
+        self.profiler = profiler
         self.reset_env()
-        self.debug = False
+        self.debug = debug
         if self.debug:
             for p in self.players:
                 p.debug = True
@@ -28,7 +35,10 @@ class PokerEnv:
 
     def _set_state(self, state):
         self.state = state
-        print_debug('State -> '+ state, self.debug)
+        if self.profiler is not None:
+            self.profiler.enter(state)
+        if self.debug:
+            print('State -> ' + state)
 
     def reset_env(self):
 
@@ -37,6 +47,8 @@ class PokerEnv:
             p.soft_reset()
 
         self.players = self.players_in_hand()
+        if self.recorder is not None:
+            self.recorder.new_game(self.initial_stack)
 
 
     def isTerminalState(self):
@@ -47,7 +59,7 @@ class PokerEnv:
 
     def _play_hand(self):
         # Init game
-        self.deck = Deck()
+        self._set_state('START')
         self.deck.shuffle()
 
         # BLINDS
@@ -60,11 +72,14 @@ class PokerEnv:
         self.pot += self.players[SMALL_BLIND].call(self.small_blind)
         self.highest_bet = max([p.on_table for p in self.players])
 
-        self._set_state('PREFLOP')
+        if self.recorder is not None:
+            self.recorder.blinds(SMALL_BLIND, self.players[SMALL_BLIND].on_table, BIG_BLIND, self.players[BIG_BLIND].on_table)
 
-        # PRE FLOP BET
         self._deal_cards()
 
+        # PRE FLOP BET
+        self._set_state('PREFLOP')
+
         keepGoing = self.betting_round(idx=UTG)
 
         #FLOP
@@ -85,6 +100,7 @@ class PokerEnv:
             self._deal_river()
             self.betting_round(idx=SMALL_BLIND)
 
+        self._set_state('WRAP_UP')
         self._resolve_winners()
         
     def betting_round(self, idx=0):
@@ -92,15 +108,24 @@ class PokerEnv:
         everyoneHasPlayed = False
         betStillToResolve = True
         moreThanOnePlayerLeft = True
+        state = self.table_state
+        state.reset(self.players, self.highest_bet)
+        record = self.recorder.action if self.recorder is not None else None
+        profiler = self.profiler
 
         while(moreThanOnePlayerLeft and (not everyoneHasPlayed or betStillToResolve)):
 
             player = self.players[idx]
-            othersCanCall = sum([p.stack for p in self.players if p.id != player.id]) > 0
+            othersCanCall = state.others_can_call(player)
+            state.remove(player)
 
             if not player.folded and player.stack > 0 and (othersCanCall or player.on_table < self.highest_bet):
 
-                action = player.act(self._get_game_state(player))
+                pot = self.pot
+                if profiler is None:
+                    action = player.act(self._get_game_state(player))
+                else:
+                    action = profiler.act(player, self._get_game_state(player))
                 
                 if action['type'] == 'CHECK':
                     if player.on_table < self.highest_bet:
@@ -115,19 +140,22 @@ class PokerEnv:
                 
                 elif action['type'] == 'BET':
                     self.pot += player.call(action['amount'])
-                    self.highest_bet = player.on_table
+                    self.highest_bet = max(self.highest_bet, player.on_table)
+                    state.raise_to(self.highest_bet)
 
+                if record is not None:
+                    record(idx, len(self.table), action['type'], self.pot - pot)
                 player.has_played = True
             
             else:
 
                 player.has_played = True
 
+            state.add(player)
             idx = (idx + 1) % len(self.players)
-            everyoneHasPlayed = all([p.folded or p.has_played or p.stack == 0 for p in self.players])
-            playersNotFolderNotAllIn = list(filter(lambda p: (not p.folded and p.stack > 0), self.players))
-            betStillToResolve = len(playersNotFolderNotAllIn) and self.highest_bet > min([ p.on_table for p in playersNotFolderNotAllIn])
-            moreThanOnePlayerLeft = len([p for p in self.players if not p.folded]) > 1
+            everyoneHasPlayed = state.everyone_has_played()
+            betStillToResolve = state.bet_still_to_resolve()
+            moreThanOnePlayerLeft = state.more_than_one_player_left()
         
         self.highest_bet = 0
 
@@ -145,57 +173,46 @@ class PokerEnv:
             'hand' : player.hand,
             'pot' : self.pot,
             'curr_bet' : self.highest_bet,
+            'on_table' : player.on_table,
             'big_blind' : self.big_blind,
-            'stacks' : map(lambda p: p.stack, self.players),
-            'on_pots' : map(lambda p: p.on_pot, self.players),
-            'stacks' : map(lambda p: p.stack, self.players),
-            'folded' : map(lambda p: p.folded, self.players)
+            # Per seat of the whole tournament, so seats keep their place
+            # when someone busts; seat is the player's own
+            'seat' : self.all_players.index(player),
+            'stacks' : map(lambda p: p.stack, self.all_players),
+            'on_pots' : map(lambda p: p.on_pot, self.all_players),
+            'folded' : map(lambda p: p.folded, self.all_players)
         }
     def _resolve_winners(self):
 
-        while(self.pot):
+        # Showdown: ranks come from each player's cached per-street evaluation
+        if self.debug:
             print(f'POT = {self.pot}')
-            # Check minimum side bet
-            min_side_bet = min([p.on_pot for p in self.players if (not p.folded) and p.on_pot > 0])
-            candidates = [p for p in self.players_in_hand() if not p.folded and p.on_pot >= min_side_bet]
-
-            # If only candidate to win, set as only winner 
-            if len(candidates) == 1:
-                winners = candidates
-
-            else:
-                # Showdown
-                candidate_hands = [p.get_combo() for p in candidates]
-                best_hand = max(candidate_hands)
-                winners = [p for p in candidates if p.get_combo() == best_hand]
-            
+        contenders = [p for p in self.players if not p.folded]
+        ranks = [p.get_rank() if not p.folded and len(contenders) > 1 else None for p in self.players]
+        result = settle_pots([p.on_pot for p in self.players], [p.folded for p in self.players], ranks)
 
-            side_pot = 0
+        if self.recorder is not None:
+            self.recorder.end_hand(self.players, self.dealer, self.deck.dealt(), result['payouts'], len(contenders) > 1)
 
-            for p in self.players:
-                amount_collected = min(p.on_pot, min_side_bet)
-                p.on_pot -= amount_collected
-                side_pot += amount_collected
-
-            win_portion = side_pot // len(winners)
-            extra_chips = side_pot % len(winners)
-
-            print_debug('side_pot -> ' + str(side_pot), self.debug)
-            print_debug('win_portion -> ' + str(win_portion), self.debug)
-            print_debug('extra_chips -> ' + str(extra_chips), self.debug)
-
-            print(f'~ ~ Winners ({len(winners)})')
-            for w in winners:
-                print(w.id, w.on_pot, w.stack, w.get_combo())
-
-            for winner in winners:
-                amount_received = win_portion
-                if extra_chips > 0:
-                    amount_received += 1
-                    extra_chips -= 1
-                print_debug(str(winner.id) + '\t' + str(amount_received), self.debug)
-                winner.stack += amount_received
-                self.pot -= amount_received                
+        if self.debug:
+            for pot in result['pots']:
+                print('side_pot -> ' + str(pot['amount']))
+                print(f"~ ~ Winners ({len(pot['winners'])})")
+                for seat, share in zip(pot['winners'], pot['shares']):
+                    w = self.players[seat]
+                    print(w.id, w.stack, w.get_combo())
+                    print(str(w.id) + '\t' + str(share))
+            for seat, refund in enumerate(result['refunds']):
+                if refund:
+                    print(f'{self.players[seat].id} gets {refund} back')
+
+        for p, amount in zip(self.players, result['payouts']):
+            p.stack += amount
+            self.pot -= p.on_pot
+            p.on_pot = 0
+
+        if self.pot:
+            raise Exception(f'{self.pot} chips left on the table after settling.')
 
     def _deal_cards(self):
 
@@ -204,7 +221,7 @@ class PokerEnv:
 
     def _update_table_players(self):
         for p in self.players:
-            p.table = self.table
+            p.set_table(self.table)
 
     def _deal_flop(self):
         self.table = self.deck.draw(3)
@@ -218,18 +235,26 @@ class PokerEnv:
         self.table.append(self.deck.drawOne())
         self._update_table_players()
 
-    def play(self):
+    def play_hand(self):
 
-        while(len(self.players) > 1):
-            self._play_hand()
-            self.table = []
-            self.dealer = (self.dealer + 1) % len(self.players)
+        if self.profiler is not None:
+            self.profiler.resume()
+        self._play_hand()
+        self.table = []
+        self.dealer = (self.dealer + 1) % len(self.players)
 
-            for player in self.players:
-                player.soft_reset()
-                print_debug(player, self.debug)
+        for player in self.players:
+            player.soft_reset()
+            print_debug(player, self.debug)
 
-            self.players = self.players_in_hand()
+        self.players = self.players_in_hand()
+        if self.profiler is not None:
+            self.profiler.pause()
+
+    def play(self):
+
+        while(len(self.players) > 1):
+            self.play_hand()
 
         print_debug('\nEnd of game! ~~  ', self.debug)
         return self.players[0].__class__.__name__
@@ -1,15 +1,24 @@
 import random
-import names
 from Deck import suit_to_repr
 from Combos import Combo
+from evaluator import PRIMES, evaluate_state
 from starting_hands import rank_hand
-from utils import print_debug
 
 class Player:
 
-    def __init__(self, name = None):
+    def __init__(self, name = None, rng = None):
         
-        self.id = names.get_first_name() if name == None else name
+        if name is None:
+            # names is only imported for players that need a made up name
+            import names
+            name = names.get_first_name()
+        self.id = name
+        # Anything with random.Random's choice/randint/random; the random
+        # module itself unless the player or its table is seeded
+        self.rng = random if rng is None else rng
+        # Set once a table seed handed out the rng, so the next seeded table
+        # replaces it instead of carrying on with a half used stream
+        self.table_rng = False
         self.stack = 0
         self.hand = []
         self.table = []
@@ -20,6 +29,7 @@ class Player:
         self.on_table = 0
         self.is_agent = False
         self.debug = False
+        self._reset_eval()
 
     def classify_hand(self):
         c1, c2 = self.hand
@@ -30,14 +40,47 @@ class Player:
 
         return f"{c1.get_number()}{c2.get_number()}{'s' if is_suited else 'o'}"
     
+    def _reset_eval(self):
+        # Prime product and suit masks of the cards seen so far this hand,
+        # and the rank for each board size already evaluated
+        self._product = 1
+        self._suit_masks = [0, 0, 0, 0]
+        self._seen = 0
+        self.street_ranks = {}
+        self.combo = None
+
+    def _add_cards(self, cards):
+        for c in cards:
+            r = c.number - 2
+            self._product *= PRIMES[r]
+            self._suit_masks[c.code & 3] |= 1 << r
+
     def set_table(self, table):
+        # The board only grows during a hand, so just fold in the new cards
         self.table = table
+        if len(table) != self._seen:
+            self._add_cards(table[self._seen:])
+            self._seen = len(table)
+            self.combo = None
 
     def set_cards(self, cards):
         self.hand = cards
+        self._reset_eval()
+        self._add_cards(cards)
+        self.set_table(self.table)
+
+    def get_rank(self):
+        if len(self.table) != self._seen:
+            self.set_table(self.table)
+        rank = self.street_ranks.get(self._seen)
+        if rank is None:
+            rank = self.street_ranks[self._seen] = evaluate_state(self._product, self._suit_masks)
+        return rank
 
     def get_combo(self):
-        self.combo = Combo(self.hand + self.table)
+        rank = self.get_rank()
+        if self.combo is None:
+            self.combo = Combo(self.hand + self.table, rank)
         return self.combo
         
     def __repr__(self):
@@ -50,6 +93,7 @@ class Player:
         self.table = []
         self.on_pot = 0
         self.on_table = 0
+        self._reset_eval()
     
     def call(self, amount):
 
@@ -61,9 +105,10 @@ class Player:
 
     def act(self, gameState):
 
-        print_debug(f'Its {self.id} time to play.', self.debug)
-        print_debug(f'Hand = {self.hand} ,On Pot/T+Stack = {self.on_pot}/{self.stack + self.on_table} -> {int(100 * self.on_pot/(self.stack + self.on_pot))}%', self.debug)
-        print_debug(f"Table: {gameState['table']} -- Curr Bet: {self.on_table}/{gameState['curr_bet']} -- Pot: {gameState['pot']}", self.debug)
+        if self.debug:
+            print(f'Its {self.id} time to play.')
+            print(f'Hand = {self.hand} ,On Pot/T+Stack = {self.on_pot}/{self.stack + self.on_table} -> {int(100 * self.on_pot/(self.stack + self.on_pot))}%')
+            print(f"Table: {gameState['table']} -- Curr Bet: {self.on_table}/{gameState['curr_bet']} -- Pot: {gameState['pot']}")
 
         choice = ''
         possible_options = []
@@ -107,15 +152,16 @@ class RandomPlayer(Player):
 
     def make_choice(self, gameState, possible_options):
 
-        choice = random.choice(possible_options)
+        choice = self.rng.choice(possible_options)
         if choice == 'BET':
-            amount = random.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
+            amount = self.rng.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
         elif choice == 'CALL':
             amount = gameState['curr_bet'] - self.on_table
         else:
             amount = 0
 
-        print_debug(str(choice) + '\t' + str(amount), self.debug)
+        if self.debug:
+            print(str(choice) + '\t' + str(amount))
         return {
             'type'  : choice,
             'amount' : amount
@@ -128,19 +174,20 @@ class SoftRandomPlayer(Player):
         my_hand = self.classify_hand()
         percentile = rank_hand(my_hand)
 
-        if random.random() < percentile:
+        if self.rng.random() < percentile:
             choice = 'BET' if 'BET' in possible_options else 'CALL'
         else:
             choice = 'FOLD' if 'FOLD' in possible_options else 'CHECK'
 
         if choice == 'BET':
-            amount = random.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
+            amount = self.rng.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
         elif choice == 'CALL':
             amount = gameState['curr_bet'] - self.on_table
         else:
             amount = 0
 
-        print_debug(str(choice) + '\t' + str(amount), self.debug)
+        if self.debug:
+            print(str(choice) + '\t' + str(amount))
         return {
             'type'  : choice,
             'amount' : amount
@@ -159,13 +206,14 @@ class TightPlayer(Player):
             choice = 'FOLD' if 'FOLD' in possible_options else 'CHECK'
 
         if choice == 'BET':
-            amount = random.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
+            amount = self.rng.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
         elif choice == 'CALL':
             amount = gameState['curr_bet'] - self.on_table
         else:
             amount = 0
 
-        print_debug(str(choice) + '\t' + str(amount), self.debug)
+        if self.debug:
+            print(str(choice) + '\t' + str(amount))
         return {
             'type'  : choice,
             'amount' : amount
@@ -184,13 +232,14 @@ class AgressivePlayer(Player):
             choice = 'FOLD' if 'FOLD' in possible_options else 'CHECK'
 
         if choice == 'BET':
-            amount = random.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
+            amount = self.rng.randint(gameState['curr_bet'] + 1, self.stack + self.on_pot)
         elif choice == 'CALL':
             amount = gameState['curr_bet'] - self.on_table
         else:
             amount = 0
 
-        print_debug(str(choice) + '\t' + str(amount), self.debug)
+        if self.debug:
+            print(str(choice) + '\t' + str(amount))
         return {
             'type'  : choice,
             'amount' : amount
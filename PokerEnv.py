@@ -1,12 +1,14 @@
 from Deck import Deck
 from Player import Player, RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
-from Combos import Combo
+from seeding import seed_table
+from settlement import settle_pots
+from table_state import TableState
 from utils import print_debug
 
 
 class PokerEnv:
 
-    def __init__(self, players, stack, small_blind):
+    def __init__(self, players, stack, small_blind, debug=False, seed=None, recorder=None, profiler=None):
         self.state = 'ZERO'
         self.initial_stack = stack
         self.agent = Player('Fabio')
@@ -22,13 +24,18 @@ class PokerEnv:
         self.pot = 0
         self.halt = False
         self.highest_bet = self.big_blind
-        self.deck = None
+        # With a seed the deck and the players get their own streams of it
+        self.deck = Deck(None if seed is None else seed_table(seed, self.all_players))
+        self.table_state = TableState()
         self.possibleActions = ['CHECK', 'BET', 'CALL', 'FOLD']
         self.idx = 0
         self.agent_prev_stack = self.agent.stack
         self.action =  None
+        # Optional hand_history.HandHistoryRecorder and instrumentation.Profiler
+        self.recorder = recorder
+        self.profiler = profiler
         self.reset_env()
-        self.debug = True
+        self.debug = debug
         if self.debug:
             for p in self.players:
                 p.debug = True
@@ -36,14 +43,18 @@ class PokerEnv:
 
     def _set_state(self, state):
         self.state = state
+        if self.profiler is not None:
+            self.profiler.enter(state)
         self.highest_bet = 0
 
         for player in self.players:
             player.on_table = 0
             if not player.folded:
                 player.has_played = False
+        self.table_state.reset(self.players, self.highest_bet)
 
-        print_debug('State -> '+ state, self.debug)
+        if self.debug:
+            print('State -> ' + state)
 
     def reset(self):
         self.reset_env()
@@ -57,6 +68,8 @@ class PokerEnv:
             p.soft_reset()
 
         self.players = self.players_in_hand()
+        if self.recorder is not None:
+            self.recorder.new_game(self.initial_stack)
 
     def isTerminalState(self):
         return len(self.players_in_hand()) == 1
@@ -69,7 +82,6 @@ class PokerEnv:
         if self.state == 'START':
 
             # Init game
-            self.deck = Deck()
             self.deck.shuffle()
             self._set_state('PREFLOP')
 
@@ -82,8 +94,12 @@ class PokerEnv:
             self.pot += self.players[self.sb_idx].call(self.small_blind)
             self.pot += self.players[self.bb_idx].call(self.big_blind)
 
+            if self.recorder is not None:
+                self.recorder.blinds(self.sb_idx, self.players[self.sb_idx].on_table, self.bb_idx, self.players[self.bb_idx].on_table)
+
             self._deal_cards()
             self.highest_bet = max([p.on_table for p in self.players])
+            self.table_state.reset(self.players, self.highest_bet)
             self.idx = UTG
         
         # PRE FLOP
@@ -183,57 +199,47 @@ class PokerEnv:
             'hand' : player.hand,
             'pot' : self.pot,
             'curr_bet' : self.highest_bet,
+            'on_table' : player.on_table,
             'big_blind' : self.big_blind,
-            'stacks' : [p.stack for p in self.players],
-            'on_pots' : [p.on_pot for p in self.players],
-            'folded' : [p.folded for p in self.players],
+            # Per seat of the whole tournament, so seats keep their place
+            # when someone busts; seat is the player's own
+            'seat' : self.all_players.index(player),
+            'stacks' : [p.stack for p in self.all_players],
+            'on_pots' : [p.on_pot for p in self.all_players],
+            'folded' : [p.folded for p in self.all_players],
         }
     
     def _resolve_winners(self):
 
-        while(self.pot):
+        # Showdown: ranks come from each player's cached per-street evaluation
+        if self.debug:
             print(f'POT = {self.pot} -- ON_POTS = {[p.on_pot for p in self.players]}')
-            # Check minimum side bet
-            min_side_bet = min([p.on_pot for p in self.players if (not p.folded) and p.on_pot > 0])
-            candidates = [p for p in self.players_in_hand() if not p.folded and p.on_pot >= min_side_bet]
-
-            # If only candidate to win, set as only winner 
-            if len(candidates) == 1:
-                winners = candidates
-
-            else:
-                # Showdown
-                candidate_hands = [p.get_combo() for p in candidates]
-                best_hand = max(candidate_hands)
-                winners = [p for p in candidates if p.get_combo() == best_hand]
-            
+        contenders = [p for p in self.players if not p.folded]
+        ranks = [p.get_rank() if not p.folded and len(contenders) > 1 else None for p in self.players]
+        result = settle_pots([p.on_pot for p in self.players], [p.folded for p in self.players], ranks)
 
-            side_pot = 0
+        if self.recorder is not None:
+            self.recorder.end_hand(self.players, self.dealer, self.deck.dealt(), result['payouts'], len(contenders) > 1)
 
-            for p in self.players:
-                amount_collected = min(p.on_pot, min_side_bet)
-                p.on_pot -= amount_collected
-                side_pot += amount_collected
-
-            win_portion = side_pot // len(winners)
-            extra_chips = side_pot % len(winners)
-
-            print_debug('side_pot -> ' + str(side_pot), self.debug)
-            print_debug('win_portion -> ' + str(win_portion), self.debug)
-            print_debug('extra_chips -> ' + str(extra_chips), self.debug)
-
-            print(f'~ ~ Winners ({len(winners)})')
-            for w in winners:
-                print(w.id, w.on_pot, w.stack, w.get_combo())
-
-            for winner in winners:
-                amount_received = win_portion
-                if extra_chips > 0:
-                    amount_received += 1
-                    extra_chips -= 1
-                print_debug(str(winner.id) + '\t' + str(amount_received), self.debug)
-                winner.stack += amount_received
-                self.pot -= amount_received                
+        if self.debug:
+            for pot in result['pots']:
+                print('side_pot -> ' + str(pot['amount']))
+                print(f"~ ~ Winners ({len(pot['winners'])})")
+                for seat, share in zip(pot['winners'], pot['shares']):
+                    w = self.players[seat]
+                    print(w.id, w.stack, w.get_combo())
+                    print(str(w.id) + '\t' + str(share))
+            for seat, refund in enumerate(result['refunds']):
+                if refund:
+                    print(f'{self.players[seat].id} gets {refund} back')
+
+        for p, amount in zip(self.players, result['payouts']):
+            p.stack += amount
+            self.pot -= p.on_pot
+            p.on_pot = 0
+
+        if self.pot:
+            raise Exception(f'{self.pot} chips left on the table after settling.')
 
     def _deal_cards(self):
 
@@ -242,7 +248,7 @@ class PokerEnv:
 
     def _update_table_players(self):
         for p in self.players:
-            p.table = self.table
+            p.set_table(self.table)
 
     def _deal_flop(self):
         self.table = self.deck.draw(3)
@@ -263,6 +269,10 @@ class PokerEnv:
 
     def play(self):
 
+        # The profiler only counts the time spent in here, not the agent's
+        if self.profiler is not None:
+            self.profiler.resume()
+
         while(len(self.players) > 1):
             keepGoing = True
 
@@ -270,6 +280,8 @@ class PokerEnv:
                 keepGoing = self._play_hand()
 
             if self.halt:
+                if self.profiler is not None:
+                    self.profiler.pause()
                 reward = self.agent.stack + self.agent.on_pot - self.agent_prev_stack
                 self.agent_prev_stack = self.agent.stack + self.agent.on_pot
                 return self._get_game_state(self.agent), reward, False, None
@@ -284,6 +296,8 @@ class PokerEnv:
             self.players = self.players_in_hand()
 
         print_debug('End of game! ~~  ', self.debug)
+        if self.profiler is not None:
+            self.profiler.pause()
         reward = self.agent.stack - self.agent_prev_stack
         if self.players[0] == self.agent:
             reward += 300
@@ -293,6 +307,8 @@ class PokerEnv:
 
     def _accept_player_move(self, player, action):
 
+        pot = self.pot
+
         if action['type'] == 'CHECK':
             if player.on_table < self.highest_bet:
                 raise('Player cannot check here!')
@@ -306,42 +322,54 @@ class PokerEnv:
         
         elif action['type'] == 'BET':
             self.pot += player.call(action['amount'])
-            self.highest_bet = player.on_table
+            self.highest_bet = max(self.highest_bet, player.on_table)
+
+        if self.recorder is not None:
+            self.recorder.action(self.idx, len(self.table), action['type'], self.pot - pot)
 
     def betting_round(self):
 
         player = self.players[self.idx]
-     
-        othersCanCall = sum([p.stack for p in self.players if p.id != player.id]) > 0
+        state = self.table_state
+        othersCanCall = state.others_can_call(player)
 
         if not player.folded and player.stack > 0 and (othersCanCall or player.on_table < self.highest_bet):
 
             if player == self.agent and self.action == None:
-                print('AGENT TIME TO ACT')
+                if self.debug:
+                    print('AGENT TIME TO ACT')
                 return 'WAIT_FOR_AGENT'
             
             elif player == self.agent:
                 action = self.action
                 self.action = None
                 
+            elif self.profiler is None:
+                action = player.act(self._get_game_state(player))
+
             else:
-                action = player.act(self._get_game_state(player))          
+                action = self.profiler.act(player, self._get_game_state(player))
+
+            state.remove(player)
             self._accept_player_move(player, action)
+            state.raise_to(self.highest_bet)
             player.has_played = True
+            state.add(player)
 
         else:
 
+            state.remove(player)
             player.has_played = True
+            state.add(player)
 
         self.idx = (self.idx + 1) % len(self.players)
-        everyoneHasPlayed = all([p.folded or p.has_played or p.stack == 0 for p in self.players])
-        playersNotFolderNotAllIn = list(filter(lambda p: (not p.folded and p.stack > 0), self.players))
-        betStillToResolve = len(playersNotFolderNotAllIn) and self.highest_bet > min([ p.on_table for p in playersNotFolderNotAllIn])
-        moreThanOnePlayerLeft = len([p for p in self.players if not p.folded]) > 1
+        everyoneHasPlayed = state.everyone_has_played()
+        betStillToResolve = state.bet_still_to_resolve()
+        moreThanOnePlayerLeft = state.more_than_one_player_left()
         
         if moreThanOnePlayerLeft and (not everyoneHasPlayed or betStillToResolve):
             return True
-        elif len([p for p in self.players if not p.folded]) == 1:
+        elif state.in_hand == 1:
             return 'RESOLVE_WINNER'
         else:
             return 'END_PHASE'
@@ -351,7 +379,7 @@ if __name__ == '__main__':
 
     players = [ RandomPlayer(), AgressivePlayer(), SoftRandomPlayer(), TightPlayer()]
     players = [ AgressivePlayer('Agressif'), SoftRandomPlayer('RandomBoy'), TightPlayer('Jonny Apertadinho')]
-    env = PokerEnv(players, 100, 2)
+    env = PokerEnv(players, 100, 2, debug=True)
     obs = env.reset()
     done = False
     while(not done):
@@ -1,10 +1,102 @@
 from Player import Player
-from model import DeepQNetwork
+from observation import ObservationEncoder, decode_action
+
+# torch takes seconds and hundreds of MB to import, so it is only loaded once
+# a network is actually needed; rule-based workers can import this module
+# for free
+T = None
+
+
+def _torch():
+    global T
+    if T is None:
+        import torch
+        T = torch
+    return T
+
+
+def load_network(path, num_players):
+
+    # Accepts either a TorchScript file or a DeepQNetwork state_dict
+    from model import DeepQNetwork
+    T = _torch()
+    try:
+        return T.jit.load(path, map_location='cpu')
+    except RuntimeError:
+        net = DeepQNetwork(0.0, num_players)
+        net.load_state_dict(T.load(path, map_location='cpu'))
+        return net
+
+
+def export_torchscript(net, path, num_players):
+    T = _torch()
+    net = net.cpu().eval()
+    net.device = T.device('cpu')
+    example = T.zeros((1, ObservationEncoder(num_players, 1).obs_dim))
+    T.jit.trace(net, example).save(path)
+
 
 class QAgentPlayer(Player):
 
-    def __init__(self, name = None):
-        super().__init__(name)
+    def __init__(self, name = None, num_players = 6, stack = 100, net = None, path = None, quantize = False, rng = None):
+        super().__init__(name, rng)
+        from model import DeepQNetwork
+        _torch()
+        self.is_agent = True
+        self.encoder = ObservationEncoder(num_players, num_players * stack)
+
+        if path is not None:
+            net = load_network(path, num_players)
+        elif net is None:
+            net = DeepQNetwork(0.0, num_players)
+
+        if isinstance(net, DeepQNetwork):
+            net.device = T.device('cpu')
+            net.to(net.device)
+            if quantize:
+                net = T.ao.quantization.quantize_dynamic(net, {T.nn.Linear}, dtype=T.qint8)
+
+        self.net = net.eval()
+
+        # The encoder writes straight into the memory of the input tensor, a
+        # batch of one since quantized layers want 2-d inputs
+        self.input = T.zeros((1, self.encoder.obs_dim))
+        self.state = self.input.numpy()[0]
+
+    def act(self, gameState):
+
+        self.encoder.encode(gameState, self.state)
+        with T.inference_mode():
+            action = int(T.argmax(self.net(self.input)))
+        return decode_action(action, gameState, self.stack)
+
+    def act_batch(self, states):
+
+        # Greedy actions for an (N, obs_dim) float32 array, e.g. as the policy
+        # of an InferenceServer
+        with T.inference_mode():
+            return T.argmax(self.net(T.from_numpy(states)), dim=1).numpy()
+
+
+if __name__ == '__main__':
+    import time
+    from Game import PokerEnv
+    from Player import AgressivePlayer, SoftRandomPlayer, TightPlayer
+
+    _torch().set_num_threads(1)
+
+    for quantize in (False, True):
+        agent = QAgentPlayer('DQN', num_players=4, quantize=quantize)
+        players = [AgressivePlayer('Agressif'), SoftRandomPlayer('RandomBoy'), TightPlayer('Jonny Apertadinho'), agent]
+        env = PokerEnv(players, 100, 2)
+        agent.hand = []
+
+        # The state is built for every decision as the game does; its
+        # per-seat fields are one-shot iterators
+        start = time.perf_counter()
+        for _ in range(10000):
+            agent.act(env._get_game_state(agent))
+        print('quantized' if quantize else 'float32', 'decisions/s', int(10000 / (time.perf_counter() - start)))
 
-    def  act(self, possibleActions):
-        pass
\ No newline at end of file
+        env.play()
+        print('winner', env.players[0].id)
@@ -0,0 +1,337 @@
+import numpy as np
+from Player import RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
+from evaluator import evaluate_batch
+from settlement import settle_batch
+from starting_hands import hole_class
+from observation import ObservationEncoder
+
+CHECK, BET, CALL, FOLD = range(4)
+
+# Scripted opponents are played by vectorized versions of their make_choice
+RANDOM, SOFT_RANDOM, TIGHT, AGRESSIVE = range(4)
+POLICIES = {
+    RandomPlayer : RANDOM,
+    SoftRandomPlayer : SOFT_RANDOM,
+    TightPlayer : TIGHT,
+    AgressivePlayer : AGRESSIVE,
+}
+
+PERCENTILE = (np.array(hole_class) + 1) / 169
+
+PREFLOP, FLOP, TURN, RIVER = range(4)
+BOARD_CARDS = [0, 3, 4, 5]
+
+
+class VecPokerEnv:
+
+    def __init__(self, num_tables, opponents, stack, small_blind, seed=None, encode=False):
+
+        # K tables of the same lineup, opponents in seats 0..P-2 and the agent
+        # in the last seat, as PokerEnv appends its agent
+        self.num_tables = num_tables
+        self.num_players = len(opponents) + 1
+        self.agent = self.num_players - 1
+        self.policies = np.array([POLICIES[cls] for cls in opponents] + [-1])
+        self.initial_stack = stack
+        self.small_blind = small_blind
+        self.big_blind = small_blind * 2
+        self.possibleActions = ['CHECK', 'BET', 'CALL', 'FOLD']
+        self.rng = np.random.default_rng(seed)
+
+        K, P = num_tables, self.num_players
+        self.stacks = np.full((K, P), stack, dtype=np.int64)
+        self.on_pot = np.zeros((K, P), dtype=np.int64)
+        self.on_table = np.zeros((K, P), dtype=np.int64)
+        self.folded = np.zeros((K, P), dtype=bool)
+        self.has_played = np.zeros((K, P), dtype=bool)
+        self.hole = np.zeros((K, P, 2), dtype=np.int32)
+        self.board = np.zeros((K, 5), dtype=np.int32)
+        self.table = np.full((K, 5), -1, dtype=np.int32)
+        self.street = np.zeros(K, dtype=np.int64)
+        self.pot = np.zeros(K, dtype=np.int64)
+        self.highest_bet = np.zeros(K, dtype=np.int64)
+        self.dealer = np.full(K, P - 1, dtype=np.int64)
+        self.sb_idx = np.zeros(K, dtype=np.int64)
+        self.idx = np.zeros(K, dtype=np.int64)
+        self.waiting = np.zeros(K, dtype=bool)
+
+        self.agent_prev_stack = np.full(K, stack, dtype=np.int64)
+        self.pending_reward = np.zeros(K, dtype=np.float64)
+        self.dones = np.zeros(K, dtype=bool)
+
+        # With encode set, observations are written into one preallocated
+        # (K, obs_dim) float32 array instead of a dict of arrays
+        self.encoder = None
+        if encode:
+            self.encoder = ObservationEncoder(P, P * stack)
+            self.obs_buffer = np.zeros((K, self.encoder.obs_dim), dtype=np.float32)
+
+    def reset(self):
+
+        rows = np.arange(self.num_tables)
+        self.stacks[:] = self.initial_stack
+        self.agent_prev_stack[:] = self.initial_stack
+        self.pending_reward[:] = 0
+        self.waiting[:] = False
+        self._new_hand(rows)
+        self._advance()
+        return self._observe()
+
+    def step(self, actions, amounts=None):
+
+        # actions index possibleActions; BET amounts are the total to have on
+        # the table, defaulting to the same minimum bet as Player.act
+        rows = np.nonzero(self.waiting)[0]
+        actions = np.asarray(actions)[rows]
+        if amounts is None:
+            amounts = np.maximum(self.big_blind, self.highest_bet[rows] * 2)
+        else:
+            amounts = np.asarray(amounts)[rows]
+
+        self.dones[:] = False
+        self.waiting[rows] = False
+        self._apply(rows, np.full(len(rows), self.agent), actions, amounts, legalize=True)
+        self._next_player(rows, np.full(len(rows), self.agent))
+        self._advance()
+
+        agent_stack = self.stacks[:, self.agent] + self.on_pot[:, self.agent]
+        rewards = self.pending_reward + agent_stack - self.agent_prev_stack
+        self.agent_prev_stack[:] = agent_stack
+        self.pending_reward[:] = 0
+
+        return self._observe(), rewards, self.dones.copy(), None
+
+    def _observe(self):
+
+        if self.encoder is not None:
+            return self.encoder.encode_batch(
+                self.obs_buffer, self.hole[:, self.agent], self.table, self.pot, self.highest_bet, self.big_blind,
+                self.stacks, self.on_pot, self.folded, self.on_table[:, self.agent], self.agent)
+
+        return {
+            'table' : self.table.copy(),
+            'hand' : self.hole[:, self.agent].copy(),
+            'pot' : self.pot.copy(),
+            'curr_bet' : self.highest_bet.copy(),
+            'big_blind' : self.big_blind,
+            'seat' : self.agent,
+            'stacks' : self.stacks.copy(),
+            'on_pots' : self.on_pot.copy(),
+            'folded' : self.folded.copy(),
+            'on_table' : self.on_table[:, self.agent].copy(),
+        }
+
+    def _next_seated(self, rows, seats, seated):
+
+        # First seat after seats (in table order) that is still in the game
+        P = self.num_players
+        order = (seats[:, None] + np.arange(1, P + 1)[None, :]) % P
+        first = np.argmax(seated[rows[:, None], order], axis=1)
+        return order[np.arange(len(rows)), first]
+
+    def _new_hand(self, rows):
+
+        P = self.num_players
+        seated = self.stacks > 0
+
+        self.on_pot[rows] = 0
+        self.on_table[rows] = 0
+        self.folded[rows] = ~seated[rows]
+        self.has_played[rows] = False
+        self.pot[rows] = 0
+        self.street[rows] = PREFLOP
+        self.table[rows] = -1
+
+        self.dealer[rows] = self._next_seated(rows, self.dealer[rows], seated)
+        sb = self._next_seated(rows, self.dealer[rows], seated)
+        bb = self._next_seated(rows, sb, seated)
+        self.sb_idx[rows] = sb
+        self.idx[rows] = self._next_seated(rows, bb, seated)
+
+        self._call(rows, sb, np.full(len(rows), self.small_blind))
+        self._call(rows, bb, np.full(len(rows), self.big_blind))
+        self.highest_bet[rows] = self.on_table[rows].max(axis=1)
+
+        # Shuffle each table's deck; hole cards then the whole board are dealt
+        # up front and the board is revealed street by street
+        deck = np.argsort(self.rng.random((len(rows), 52)), axis=1).astype(np.int32)
+        self.hole[rows] = deck[:, :2 * P].reshape(len(rows), P, 2)
+        self.board[rows] = deck[:, 2 * P:2 * P + 5]
+
+    def _call(self, rows, seats, amounts):
+
+        to_pot = np.clip(np.minimum(self.stacks[rows, seats], amounts - self.on_table[rows, seats]), 0, None)
+        self.stacks[rows, seats] -= to_pot
+        self.on_pot[rows, seats] += to_pot
+        self.on_table[rows, seats] += to_pot
+        self.pot[rows] += to_pot
+
+    def _can_act(self, rows, seats):
+
+        stack = self.stacks[rows, seats]
+        others_can_call = self.stacks[rows].sum(axis=1) - stack > 0
+        return ~self.folded[rows, seats] & (stack > 0) & (others_can_call | (self.on_table[rows, seats] < self.highest_bet[rows]))
+
+    def _options(self, rows, seats):
+
+        # Same rules as Player.act, one column per entry of possibleActions
+        curr_bet = self.highest_bet[rows]
+        on_table = self.on_table[rows, seats]
+        stack = self.stacks[rows, seats]
+        options = np.zeros((len(rows), 4), dtype=bool)
+        options[:, CHECK] = curr_bet == on_table
+        options[:, BET] = curr_bet < stack
+        options[:, CALL] = (curr_bet > on_table) & (stack > 0)
+        options[:, FOLD] = options[:, CALL]
+        return options
+
+    def _policy(self, rows, seats):
+
+        n = len(rows)
+        options = self._options(rows, seats)
+        policy = self.policies[seats]
+        hole = self.hole[rows, seats]
+        percentile = PERCENTILE[hole[:, 0] * 52 + hole[:, 1]]
+
+        draw = self.rng.random(n)
+        aggressive = np.select(
+            [policy == SOFT_RANDOM, policy == TIGHT, policy == AGRESSIVE],
+            [draw < percentile, percentile > 0.85, percentile > 0.5],
+            False,
+        )
+        actions = np.where(aggressive,
+                           np.where(options[:, BET], BET, CALL),
+                           np.where(options[:, FOLD], FOLD, CHECK))
+
+        # RandomPlayer picks uniformly among its options
+        is_random = policy == RANDOM
+        if is_random.any():
+            weights = options[is_random] * self.rng.random((is_random.sum(), 4))
+            actions[is_random] = np.argmax(weights, axis=1)
+
+        low = self.highest_bet[rows] + 1
+        high = self.stacks[rows, seats] + self.on_pot[rows, seats]
+        amounts = low + np.floor(self.rng.random(n) * np.maximum(high - low + 1, 1)).astype(np.int64)
+
+        return actions, amounts
+
+    def _apply(self, rows, seats, actions, amounts, legalize=False):
+
+        if legalize:
+            # Checking into a bet folds, calling nothing checks
+            facing_bet = self.on_table[rows, seats] < self.highest_bet[rows]
+            actions = np.where((actions == CHECK) & facing_bet, FOLD, actions)
+            actions = np.where((actions == CALL) & ~facing_bet, CHECK, actions)
+            amounts = np.maximum(amounts, self.highest_bet[rows])
+
+        call = actions == CALL
+        self._call(rows[call], seats[call], self.highest_bet[rows[call]])
+
+        fold = actions == FOLD
+        self.folded[rows[fold], seats[fold]] = True
+
+        bet = actions == BET
+        self._call(rows[bet], seats[bet], amounts[bet])
+        self.highest_bet[rows[bet]] = np.maximum(self.highest_bet[rows[bet]], self.on_table[rows[bet], seats[bet]])
+
+    def _advance(self):
+
+        # Moves every table one seat at a time until each one is waiting for
+        # the agent to act
+        while True:
+            rows = np.nonzero(~self.waiting)[0]
+            if len(rows) == 0:
+                return
+
+            seats = self.idx[rows]
+            acts = self._can_act(rows, seats)
+
+            agent_turn = acts & (seats == self.agent)
+            self.waiting[rows[agent_turn]] = True
+
+            bots = acts & (seats != self.agent)
+            if bots.any():
+                actions, amounts = self._policy(rows[bots], seats[bots])
+                self._apply(rows[bots], seats[bots], actions, amounts)
+
+            moved = ~agent_turn
+            self._next_player(rows[moved], seats[moved])
+
+    def _next_player(self, rows, seats):
+
+        self.has_played[rows, seats] = True
+        self.idx[rows] = (seats + 1) % self.num_players
+
+        folded = self.folded[rows]
+        stacks = self.stacks[rows]
+        not_folded = ~folded
+        active = not_folded & (stacks > 0)
+
+        everyone_has_played = (folded | self.has_played[rows] | (stacks == 0)).all(axis=1)
+        bet_to_resolve = (active & (self.on_table[rows] < self.highest_bet[rows][:, None])).any(axis=1)
+        players_left = not_folded.sum(axis=1)
+
+        keep_going = (players_left > 1) & (~everyone_has_played | bet_to_resolve)
+        one_left = players_left == 1
+        end_phase = ~keep_going & ~one_left
+
+        showdown = end_phase & (self.street[rows] == RIVER)
+        next_street = rows[end_phase & ~showdown]
+
+        if len(next_street):
+            self.street[next_street] += 1
+            visible = np.arange(5)[None, :] < np.array(BOARD_CARDS)[self.street[next_street]][:, None]
+            self.table[next_street] = np.where(visible, self.board[next_street], -1)
+            self.on_table[next_street] = 0
+            self.has_played[next_street] = self.folded[next_street]
+            self.highest_bet[next_street] = 0
+            self.idx[next_street] = self.sb_idx[next_street]
+
+        finished = rows[one_left | showdown]
+        if len(finished):
+            self._finish_hand(finished)
+
+    def _settle(self, rows):
+
+        # Side pots as in settlement.settle_pots, every finished table at once
+        P = self.num_players
+        cards = np.concatenate([self.hole[rows], np.broadcast_to(self.board[rows][:, None, :], (len(rows), P, 5))], axis=2)
+        ranks = evaluate_batch(cards.reshape(-1, 7)).reshape(len(rows), P)
+        return settle_batch(self.on_pot[rows], self.folded[rows], ranks)
+
+    def _finish_hand(self, rows):
+
+        self.stacks[rows] += self._settle(rows)
+        self.on_pot[rows] = 0
+        self.on_table[rows] = 0
+        self.pot[rows] = 0
+
+        agent_stack = self.stacks[rows, self.agent]
+        won = (self.stacks[rows] > 0).sum(axis=1) == 1
+        lost = agent_stack == 0
+        over = rows[won | lost]
+
+        if len(over):
+            bonus = np.where(self.stacks[over, self.agent] > 0, 300, -200)
+            self.pending_reward[over] += self.stacks[over, self.agent] - self.agent_prev_stack[over] + bonus
+            self.dones[over] = True
+            self.stacks[over] = self.initial_stack
+            self.agent_prev_stack[over] = self.initial_stack
+
+        self._new_hand(rows)
+
+
+if __name__ == '__main__':
+    import time
+
+    env = VecPokerEnv(1024, [AgressivePlayer, SoftRandomPlayer, TightPlayer], 100, 2, seed=0, encode=True)
+    obs = env.reset()
+    rng = np.random.default_rng(1)
+
+    start = time.perf_counter()
+    episodes = 0
+    for _ in range(200):
+        obs, rewards, dones, info = env.step(rng.integers(0, 4, env.num_tables))
+        episodes += dones.sum()
+    elapsed = time.perf_counter() - start
+    print('agent decisions/s', int(200 * env.num_tables / elapsed), 'episodes', episodes)
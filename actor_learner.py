@@ -0,0 +1,274 @@
+import time
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from observation import obs_dim
+
+
+class SharedRingBuffer:
+
+    # Single producer / single consumer ring of transitions in shared memory.
+    # Each row is state, action, reward, next state, done as float32; the
+    # header holds the write (head) and read (tail) counters.
+
+    HEADER = 2
+
+    def __init__(self, capacity, state_dim, name=None):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.row = 2 * state_dim + 3
+        size = self.HEADER * 8 + capacity * self.row * 4
+
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.counters = np.ndarray(self.HEADER, dtype=np.int64, buffer=self.shm.buf)
+        self.rows = np.ndarray((capacity, self.row), dtype=np.float32, buffer=self.shm.buf, offset=self.HEADER * 8)
+        if name is None:
+            self.counters[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def push(self, state, action, reward, next_state, done):
+
+        # Returns False when the consumer has fallen a full ring behind
+        head, tail = self.counters
+        if head - tail >= self.capacity:
+            return False
+
+        d = self.state_dim
+        row = self.rows[head % self.capacity]
+        row[:d] = state
+        row[d] = action
+        row[d + 1] = reward
+        row[d + 2:2 * d + 2] = next_state
+        row[2 * d + 2] = done
+
+        # Publish only once the row is complete
+        self.counters[0] = head + 1
+        return True
+
+    def drain(self, memory):
+
+        # Moves every published row into a ReplayBuffer and frees the slots
+        head, tail = self.counters
+        if head == tail:
+            return 0
+
+        idx = np.arange(tail, head) % self.capacity
+        rows = self.rows[idx]
+        d = self.state_dim
+        memory.store_batch(rows[:, :d], rows[:, d].astype(np.int64), rows[:, d + 1], rows[:, d + 2:2 * d + 2], rows[:, 2 * d + 2])
+
+        self.counters[1] = head
+        return head - tail
+
+    def close(self, unlink=False):
+        del self.counters, self.rows
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SharedWeights:
+
+    # Flat float32 copy of a network's parameters guarded by a sequence
+    # counter: odd while the learner is writing, even once it is consistent
+
+    def __init__(self, size, name=None):
+        self.size = size
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=8 + size * 4)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.version = np.ndarray(1, dtype=np.int64, buffer=self.shm.buf)
+        self.params = np.ndarray(size, dtype=np.float32, buffer=self.shm.buf, offset=8)
+        if name is None:
+            self.version[0] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def publish(self, vector):
+        self.version[0] += 1
+        self.params[:] = vector
+        self.version[0] += 1
+
+    def read(self, out):
+
+        # Copies the weights into out and returns their version, or -1 if
+        # the learner was halfway through an update
+        version = int(self.version[0])
+        if version % 2:
+            return -1
+        out[:] = self.params
+        return version if int(self.version[0]) == version else -1
+
+    def close(self, unlink=False):
+        del self.version, self.params
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def actor_epsilon(actor_id, num_actors, base=0.4, alpha=7):
+    # Each actor explores at its own fixed rate, from base down to base ** 8
+    if num_actors == 1:
+        return base
+    return base ** (1 + alpha * actor_id / (num_actors - 1))
+
+
+def run_actor(actor_id, ring_name, weights_name, capacity, opponents, stack, small_blind, epsilon, seed, sync_every, stop):
+
+    import torch as T
+    from torch.nn.utils import parameters_to_vector, vector_to_parameters
+    from model import DeepQNetwork
+    from observation import ObservationEncoder, decode_action
+    from PokerEnv import PokerEnv
+
+    T.set_num_threads(1)
+    rng = np.random.default_rng(seed)
+    num_players = len(opponents) + 1
+
+    net = DeepQNetwork(0.0, num_players)
+    net.device = T.device('cpu')
+    net.to(net.device)
+    flat = parameters_to_vector(net.parameters()).detach().numpy().copy()
+
+    ring = SharedRingBuffer(capacity, obs_dim(num_players), ring_name)
+    weights = SharedWeights(len(flat), weights_name)
+    encoder = ObservationEncoder(num_players, num_players * stack)
+    state = np.zeros(encoder.obs_dim, dtype=np.float32)
+    next_state = np.zeros(encoder.obs_dim, dtype=np.float32)
+
+    players = [cls(f'{cls.__name__}-{i}') for i, cls in enumerate(opponents)]
+    env = PokerEnv(players, stack, small_blind, seed=seed)
+
+    version = 0
+    steps = 0
+    obs = env.reset()
+    encoder.encode(obs, state)
+
+    while not stop.is_set():
+
+        if steps % sync_every == 0:
+            new_version = weights.read(flat)
+            if new_version > version:
+                vector_to_parameters(T.from_numpy(flat), net.parameters())
+                version = new_version
+
+        if rng.random() < epsilon:
+            action = int(rng.integers(0, 4))
+        else:
+            with T.no_grad():
+                action = int(T.argmax(net.forward(T.from_numpy(state))).item())
+
+        obs, reward, done, info = env.step(decode_action(action, obs, env.agent.stack))
+        encoder.encode(obs, next_state)
+
+        while not ring.push(state, action, reward, next_state, done):
+            if stop.is_set():
+                break
+            time.sleep(0.001)
+
+        if done:
+            obs = env.reset()
+            encoder.encode(obs, state)
+        else:
+            state, next_state = next_state, state
+        steps += 1
+
+    ring.close()
+    weights.close()
+
+
+class Learner:
+
+    def __init__(self, agent, opponents, stack, small_blind, num_actors=2, ring_capacity=1 << 14,
+                 batch_size=64, broadcast_every=50, sync_every=100, seed=0):
+
+        # agent is a model.Agent; its Q_eval network is trained here and its
+        # weights are broadcast to num_actors processes playing PokerEnv
+        from torch.nn.utils import parameters_to_vector
+
+        self.agent = agent
+        self.opponents = opponents
+        self.batch_size = batch_size
+        self.broadcast_every = broadcast_every
+        self.num_players = len(opponents) + 1
+        self.parameters_to_vector = parameters_to_vector
+
+        state_dim = obs_dim(self.num_players)
+        self.rings = [SharedRingBuffer(ring_capacity, state_dim) for _ in range(num_actors)]
+        self.weights = SharedWeights(len(self._flat_weights()))
+        self.weights.publish(self._flat_weights())
+
+        ctx = mp.get_context('spawn')
+        self.stop = ctx.Event()
+        seeds = np.random.SeedSequence(seed).generate_state(num_actors)
+        self.actors = [
+            ctx.Process(target=run_actor, args=(
+                i, ring.name, self.weights.name, ring_capacity, opponents, stack, small_blind,
+                actor_epsilon(i, num_actors), int(seeds[i]), sync_every, self.stop), daemon=True)
+            for i, ring in enumerate(self.rings)
+        ]
+
+        self.transitions = 0
+        self.updates = 0
+
+    def _flat_weights(self):
+        return self.parameters_to_vector(self.agent.Q_eval.parameters()).detach().cpu().numpy()
+
+    def start(self):
+        for actor in self.actors:
+            actor.start()
+
+    def run(self, updates):
+
+        # Never blocks on the actors: whatever they have published is drained
+        # and one gradient step is taken per iteration once memory is warm
+        target = self.updates + updates
+        while self.updates < target:
+            for ring in self.rings:
+                self.transitions += ring.drain(self.agent.memory)
+
+            if len(self.agent.memory) < self.batch_size:
+                time.sleep(0.001)
+                continue
+
+            self.agent.learn(self.batch_size)
+            self.updates += 1
+
+            if self.updates % self.broadcast_every == 0:
+                self.weights.publish(self._flat_weights())
+
+    def close(self):
+        self.stop.set()
+        for actor in self.actors:
+            actor.join()
+        for ring in self.rings:
+            ring.close(unlink=True)
+        self.weights.close(unlink=True)
+
+
+if __name__ == '__main__':
+    from model import Agent
+    from Player import AgressivePlayer, SoftRandomPlayer, TightPlayer
+
+    opponents = [AgressivePlayer, SoftRandomPlayer, TightPlayer]
+    agent = Agent(gamma=0.99, epsilon=0.0, alpha=1e-3, maxMemorySize=100000, numPlayers=len(opponents) + 1)
+    learner = Learner(agent, opponents, 100, 2, num_actors=2)
+    learner.start()
+
+    start = time.perf_counter()
+    learner.run(500)
+    elapsed = time.perf_counter() - start
+    learner.close()
+
+    print('updates/s', int(learner.updates / elapsed), 'transitions/s', int(learner.transitions / elapsed))
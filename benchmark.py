@@ -0,0 +1,381 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from Deck import Deck, card
+from Combos import Combo
+from evaluator import evaluate, category, HAND_TYPES, FOUR_OF_A_KIND, STRAIGHT_FLUSH
+from Game import PokerEnv
+from hand_history import HandHistoryRecorder
+from Player import RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
+from settlement import settle_pots
+from simulation import simulate
+
+# Every section takes the seed and a scale factor and returns a dict, so runs
+# can be diffed as JSON. Rates are from the best of a few repeats, which is
+# the least noisy figure on a shared machine.
+
+LINEUP = [RandomPlayer, AgressivePlayer, SoftRandomPlayer, TightPlayer]
+
+
+def _best(fn, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _players(n, stack=0):
+    players = [LINEUP[i % len(LINEUP)](f'{LINEUP[i % len(LINEUP)].__name__}-{i}') for i in range(n)]
+    for p in players:
+        p.stack = stack
+    return players
+
+
+def _hands_by_category(rng, per_category):
+
+    # Random 7 card hands sorted by category. Four of a kind and straight
+    # flushes are too rare to sample, so those are built around a quad or a
+    # straight flush and filled up with random cards.
+    hands = {c: [] for c in range(len(HAND_TYPES))}
+    while any(len(hands[c]) < per_category for c in range(FOUR_OF_A_KIND)):
+        for codes in rng.permuted(np.tile(np.arange(52), (1000, 1)), axis=1)[:, :7].tolist():
+            hands[category(evaluate(codes))].append(codes)
+
+    while len(hands[FOUR_OF_A_KIND]) < per_category or len(hands[STRAIGHT_FLUSH]) < per_category:
+        r = int(rng.integers(13))
+        quad = [r * 4 + s for s in range(4)]
+        s, high = int(rng.integers(4)), int(rng.integers(3, 13))
+        straight = [((high - i) % 13) * 4 + s for i in range(5)]
+        for made in (quad, straight):
+            rest = [c for c in rng.permutation(52).tolist() if c not in made]
+            codes = made + rest[:7 - len(made)]
+            hands[category(evaluate(codes))].append(codes)
+
+    return {HAND_TYPES[c]: hands[c][:per_category] for c in hands}
+
+
+def bench_evaluator(seed, scale):
+
+    # Combo builds Card lists into a ranked hand; evaluate is the bare call
+    # on card codes underneath it
+    rng = np.random.default_rng(seed)
+    result = {}
+    for name, hands in _hands_by_category(rng, int(2000 * scale)).items():
+        cards = [[card(c) for c in codes] for codes in hands]
+
+        def combos():
+            for hand in cards:
+                Combo(hand)
+
+        def evaluations():
+            for codes in hands:
+                evaluate(codes)
+
+        result[name] = {
+            'combo_per_s' : len(hands) / _best(combos),
+            'evaluate_per_s' : len(hands) / _best(evaluations)
+        }
+    return result
+
+
+def bench_deck(seed, scale):
+
+    # A six handed deal: shuffle, two cards per seat, flop, turn and river
+    deck = Deck(np.random.default_rng(seed))
+    n = int(20000 * scale)
+
+    def deal():
+        for _ in range(n):
+            deck.shuffle()
+            for _ in range(6):
+                deck.draw(2)
+            deck.draw(3)
+            deck.drawOne()
+            deck.drawOne()
+
+    return {'deals_per_s' : n / _best(deal)}
+
+
+class _ActionCounter:
+
+    # Stands in for a hand history recorder to count the actions taken
+    def __init__(self):
+        self.actions = 0
+
+    def new_game(self, stack):
+        pass
+
+    def blinds(self, small_seat, small, big_seat, big):
+        pass
+
+    def action(self, seat, board_len, kind, amount):
+        self.actions += 1
+
+    def end_hand(self, players, dealer, cards, payouts, showdown):
+        pass
+
+
+class _TimedEnv(PokerEnv):
+
+    def betting_round(self, idx=0):
+        start = time.perf_counter()
+        keep_going = super().betting_round(idx)
+        self.round_time += time.perf_counter() - start
+        return keep_going
+
+
+def bench_betting_round(seed, scale):
+
+    # Only the time spent inside betting_round counts
+    counter = _ActionCounter()
+    env = _TimedEnv(_players(6), 100, 2, seed=seed, recorder=counter)
+    env.round_time = 0.0
+    for _ in range(int(100 * scale)):
+        env.reset_env()
+        while len(env.players) > 1:
+            env.play_hand()
+    return {
+        'actions' : counter.actions,
+        'actions_per_s' : counter.actions / env.round_time
+    }
+
+
+def bench_hands(seed, scale):
+
+    # Whole tournaments of bots, 2 to 9 seats
+    result = {}
+    for n in range(2, 10):
+        games = max(1, int(400 * scale / n))
+        hands = simulate(_players(n), 100, 2, games, seed=seed)['hands']
+        elapsed = _best(lambda: simulate(_players(n), 100, 2, games, seed=seed))
+        result[str(n)] = {'hands' : hands, 'hands_per_s' : hands / elapsed}
+    return result
+
+
+def bench_recording(seed, scale):
+
+    # Whole four seat tournaments without a recorder, with one that only
+    # counts actions (the cost of calling the hooks) and with a
+    # HandHistoryRecorder writing a file, plain and compressed. Runs are
+    # interleaved and every mode replays the same games, and the overhead is
+    # the median of the paired ratios to the run without a recorder: on a
+    # busy machine two runs differ by more than recording costs.
+    games = max(1, int(100 * scale))
+    modes = ['off', 'hooks', 'plain', 'compressed']
+    path = os.path.join(tempfile.mkdtemp(), 'hands.phh')
+    times = {mode: [] for mode in modes}
+    sizes = {}
+
+    for i in range(max(3, int(15 * scale))):
+        for mode in modes[i % len(modes):] + modes[:i % len(modes)]:
+            players = _players(4)
+            start = time.perf_counter()
+            if mode == 'off':
+                hands = simulate(players, 100, 2, games, seed=seed + i)['hands']
+            elif mode == 'hooks':
+                hands = simulate(players, 100, 2, games, seed=seed + i, recorder=_ActionCounter())['hands']
+            else:
+                with HandHistoryRecorder(path, compress=mode == 'compressed') as recorder:
+                    hands = simulate(players, 100, 2, games, seed=seed + i, recorder=recorder)['hands']
+            times[mode].append((time.perf_counter() - start) / hands)
+            if os.path.exists(path):
+                sizes[mode] = os.path.getsize(path) / hands
+                os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+    result = {}
+    for mode in modes:
+        result[mode] = {
+            'us_per_hand' : min(times[mode]) * 1e6,
+            'overhead_pct' : float(np.median(np.array(times[mode]) / times['off']) - 1) * 100
+        }
+        if mode in sizes:
+            result[mode]['bytes_per_hand'] = sizes[mode]
+    return result
+
+
+def bench_resolve_winners(seed, scale):
+
+    # n seats all in for different amounts after the river, which makes a
+    # main pot and n - 1 side pots. The cost of putting the chips back
+    # before every call is measured on its own and taken out.
+    result = {}
+    n_calls = int(5000 * scale)
+    for n in range(2, 10):
+        env = PokerEnv(_players(n, 1000), 1000, 2, seed=seed)
+        env.deck.shuffle()
+        env._deal_cards()
+        env._deal_flop()
+        env._deal_turn()
+        env._deal_river()
+        contributions = [10 * (i + 1) for i in range(n)]
+        players = env.players
+
+        def put_back():
+            for p, c in zip(players, contributions):
+                p.on_pot = c
+            env.pot = sum(contributions)
+
+        def resolve():
+            for _ in range(n_calls):
+                put_back()
+                env._resolve_winners()
+
+        def baseline():
+            for _ in range(n_calls):
+                put_back()
+
+        put_back()
+        pots = len(settle_pots(contributions, [False] * n, [p.get_rank() for p in players])['pots'])
+        elapsed = max(_best(resolve) - _best(baseline), 1e-9)
+        result[str(n)] = {'pots' : pots, 'us_per_call' : elapsed / n_calls * 1e6, 'calls_per_s' : n_calls / elapsed}
+    return result
+
+
+def bench_learn(seed, scale):
+
+    # Agent.learn on a replay memory of random transitions
+    import torch as T
+    from model import Agent
+    from observation import obs_dim
+
+    T.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    result = {'threads' : T.get_num_threads()}
+    steps = max(1, int(50 * scale))
+    dim = obs_dim(6)
+
+    for batch_size in (32, 64, 128, 256):
+        agent = Agent(gamma=0.99, epsilon=1.0, alpha=0.003, maxMemorySize=5000, replace=100, numPlayers=6)
+        agent.memory.rng = np.random.default_rng(seed)
+        memory = agent.memory
+        n = memory.capacity
+        memory.store_batch(rng.random((n, dim), dtype=np.float32), rng.integers(0, 4, n),
+                           rng.standard_normal(n).astype(np.float32), rng.random((n, dim), dtype=np.float32),
+                           (rng.random(n) < 0.1).astype(np.float32))
+        agent.learn(batch_size)
+
+        def learn():
+            for _ in range(steps):
+                agent.learn(batch_size)
+
+        result[str(batch_size)] = {'steps_per_s' : steps / _best(learn)}
+    return result
+
+
+# Each case runs in a fresh interpreter, which reports how long the code took
+# after startup, its peak RSS in KB and which heavy modules ended up loaded.
+# Linux carries ru_maxrss over from the parent across exec, so VmHWM is used
+# where /proc has it; ru_maxrss is in KB on Linux and in bytes on macOS.
+_STARTUP = '''
+import json, os, resource, sys, time
+start = time.perf_counter()
+{code}
+seconds = time.perf_counter() - start
+if os.path.exists('/proc/self/status'):
+    maxrss = int(next(line for line in open('/proc/self/status') if line.startswith('VmHWM')).split()[1])
+else:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+print(json.dumps({{
+    'seconds' : seconds,
+    'maxrss_kb' : maxrss,
+    'torch' : 'torch' in sys.modules,
+    'names' : 'names' in sys.modules
+}}))
+'''
+
+STARTUP_CASES = {
+    'interpreter' : 'pass',
+    'simulation_worker' : 'from tournament import run_shard\n'
+                          'from Player import RandomPlayer, TightPlayer\n'
+                          'run_shard([RandomPlayer, TightPlayer], 100, 2, 1, 0)',
+    'worker_importing_qagent' : 'import QAgentPlayer\n'
+                                'from tournament import run_shard\n'
+                                'from Player import RandomPlayer, TightPlayer\n'
+                                'run_shard([RandomPlayer, TightPlayer], 100, 2, 1, 0)',
+    'unnamed_player' : 'from Player import RandomPlayer\nRandomPlayer()',
+    'qagent_player' : 'from QAgentPlayer import QAgentPlayer\nQAgentPlayer(\'DQN\', num_players=2)',
+}
+
+
+def bench_startup(seed, scale):
+
+    # Wall time of spawning the process and running the case, as a pool
+    # worker would, and the child's own peak RSS
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = {}
+    for name, code in STARTUP_CASES.items():
+        runs = []
+        for _ in range(max(1, int(5 * scale))):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, '-c', _STARTUP.format(code=code)], cwd=here,
+                                 capture_output=True, text=True, check=True).stdout
+            wall = time.perf_counter() - start
+            runs.append((wall, json.loads(out.strip().splitlines()[-1])))
+        wall, child = min(runs, key=lambda run: run[0])
+        result[name] = {
+            'wall_seconds' : wall,
+            'code_seconds' : child['seconds'],
+            'maxrss_mb' : child['maxrss_kb'] / 1024,
+            'torch' : child['torch'],
+            'names' : child['names']
+        }
+    return result
+
+
+BENCHMARKS = {
+    'evaluator' : bench_evaluator,
+    'deck' : bench_deck,
+    'betting_round' : bench_betting_round,
+    'hands' : bench_hands,
+    'recording' : bench_recording,
+    'resolve_winners' : bench_resolve_winners,
+    'learn' : bench_learn,
+    'startup' : bench_startup,
+}
+
+
+def run(names=None, seed=0, scale=1.0):
+
+    result = {
+        'meta' : {
+            'python' : platform.python_version(),
+            'numpy' : np.__version__,
+            'machine' : platform.machine(),
+            'seed' : seed,
+            'scale' : scale
+        }
+    }
+    for name in names or BENCHMARKS:
+        start = time.perf_counter()
+        result[name] = BENCHMARKS[name](seed, scale)
+        result['meta'][f'{name}_seconds'] = time.perf_counter() - start
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmarks', nargs='*', help=f'any of {", ".join(BENCHMARKS)}, all by default')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float, default=1.0, help='work per benchmark, 0.1 for a quick run')
+    parser.add_argument('--output', default=None, help='also write the JSON to this file')
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark {name}')
+
+    result = run(args.benchmarks, args.seed, args.scale)
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
@@ -0,0 +1,42 @@
+import argparse
+import numpy as np
+from Deck import card_code, num_to_repr
+from equity import equity, shutdown_pool
+from starting_hands import hands, EQUITY_TABLE_PATH, MIN_PLAYERS, MAX_PLAYERS
+
+repr_to_num = {v: k for k, v in num_to_repr.items()}
+
+
+def class_cards(hand):
+
+    # A representative pair of hole cards for a class name such as 'AKs'
+    r1, r2 = [repr_to_num[c] if c in repr_to_num else int(c) for c in hand[:2]]
+    suit_2 = 'H' if hand[2] == 's' else 'D'
+    return [card_code(r1, 'H'), card_code(r2, suit_2)]
+
+
+def build_table(trials, workers, seed):
+
+    table = np.zeros((len(hands), MAX_PLAYERS - MIN_PLAYERS + 1), dtype=np.float32)
+
+    for i, hand in enumerate(hands):
+        for players in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+            result = equity(class_cards(hand), [], opponents=players - 1, trials=trials, workers=workers, seed=[seed, i, players])
+            table[i, players - MIN_PLAYERS] = result['equity']
+        print(hand, np.round(table[i], 3))
+
+    return table
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trials', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=EQUITY_TABLE_PATH)
+    args = parser.parse_args()
+
+    table = build_table(args.trials, args.workers, args.seed)
+    shutdown_pool()
+    np.save(args.output, table)
@@ -0,0 +1,229 @@
+import os
+import numpy as np
+from collections import Counter
+from itertools import combinations, product
+from math import factorial
+from concurrent.futures import ProcessPoolExecutor
+from evaluator import evaluate_batch
+
+Z_95 = 1.96
+
+RANKS = 13
+SUITS = 4
+
+_pool = None
+_pool_workers = 0
+
+
+def card_codes(cards):
+    return [c if isinstance(c, (int, np.integer)) else c.code for c in cards]
+
+
+def remaining_codes(known):
+    known = set(known)
+    return np.array([c for c in range(52) if c not in known], dtype=np.int32)
+
+
+def showdown_shares(hero_ranks, opponent_ranks):
+
+    # hero_ranks is (N,), opponent_ranks (N, K). Ties split the pot evenly.
+    best = opponent_ranks.max(axis=1)
+    ties = (opponent_ranks == best[:, None]).sum(axis=1)
+    return np.where(hero_ranks > best, 1.0, np.where(hero_ranks == best, 1.0 / (ties + 1), 0.0))
+
+
+def simulate(hand, table, opponents, trials, seed=None):
+
+    rng = np.random.default_rng(seed)
+    remaining = remaining_codes(hand + table)
+    missing = 5 - len(table)
+    need = missing + 2 * opponents
+
+    # Uniform sample without replacement of the unseen cards, one row per trial
+    order = np.argsort(rng.random((trials, len(remaining))), axis=1)[:, :need]
+    draws = remaining[order]
+
+    board = np.concatenate([np.broadcast_to(np.array(table, dtype=np.int32), (trials, len(table))), draws[:, :missing]], axis=1)
+    hero = evaluate_batch(np.concatenate([np.broadcast_to(np.array(hand, dtype=np.int32), (trials, 2)), board], axis=1))
+
+    opponent_ranks = np.empty((trials, opponents), dtype=hero.dtype)
+    for k in range(opponents):
+        hole = draws[:, missing + 2 * k: missing + 2 * k + 2]
+        opponent_ranks[:, k] = evaluate_batch(np.concatenate([hole, board], axis=1))
+
+    shares = showdown_shares(hero, opponent_ranks)
+    return shares.sum(), np.square(shares).sum(), trials
+
+
+def get_pool(workers):
+
+    global _pool, _pool_workers
+
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+
+    global _pool, _pool_workers
+
+    if _pool is not None:
+        _pool.shutdown()
+    _pool = None
+    _pool_workers = 0
+
+
+def equity(hand, table, opponents=1, trials=20000, confidence=None, workers=None, batch_size=5000, seed=None):
+
+    # trials is the maximum budget. With confidence set, sampling stops as soon
+    # as the 95% interval half width drops below it.
+    hand = card_codes(hand)
+    table = card_codes(table)
+    workers = workers or os.cpu_count()
+
+    seeds = np.random.SeedSequence(seed)
+    total = total_sq = done = 0
+
+    while done < trials:
+
+        chunks = []
+        while done + sum(chunks) < trials and len(chunks) < workers:
+            chunks.append(min(batch_size, trials - done - sum(chunks)))
+
+        if workers == 1:
+            results = [simulate(hand, table, opponents, chunks[0], seeds.spawn(1)[0])]
+        else:
+            pool = get_pool(workers)
+            futures = [pool.submit(simulate, hand, table, opponents, n, s) for n, s in zip(chunks, seeds.spawn(len(chunks)))]
+            results = [f.result() for f in futures]
+
+        for s, sq, n in results:
+            total += s
+            total_sq += sq
+            done += n
+
+        mean = total / done
+        stderr = np.sqrt(max(total_sq / done - mean * mean, 0.0) / done)
+
+        if confidence is not None and Z_95 * stderr <= confidence:
+            break
+
+    return {
+        'equity' : float(mean),
+        'stderr' : float(stderr),
+        'trials' : done,
+    }
+
+
+def canonical_runouts(known_groups, board, missing):
+
+    # One board per suit isomorphism class of the runouts of the missing
+    # cards, built directly the way HandIndexer orders suits: suits the known
+    # cards and the board can not tell apart are interchangeable, and along a
+    # run of them each suit gets a rank set no greater than the one before.
+    # Each board is weighted by the number of runouts its class stands for.
+    groups = list(known_groups) + [board]
+    masks = [[0] * SUITS for _ in groups]
+    for group, group_masks in zip(groups, masks):
+        for c in group:
+            group_masks[c & 3] |= 1 << (c >> 2)
+
+    signature = [tuple(group_masks[s] for group_masks in masks) for s in range(SUITS)]
+    order = sorted(range(SUITS), key=signature.__getitem__)
+    used = [sum(group_masks[s] for group_masks in masks) for s in range(SUITS)]
+    free = [[r for r in range(RANKS) if not used[s] >> r & 1] for s in range(SUITS)]
+
+    # Runs of interchangeable suits as [start, end) positions in order
+    runs = []
+    for i, s in enumerate(order):
+        if runs and signature[s] == signature[order[runs[-1][0]]]:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    runs = [(start, end) for start, end in runs if end - start > 1]
+    tied = [i for start, end in runs for i in range(start + 1, end)]
+
+    boards = []
+    weights = []
+    for counts in product(range(missing + 1), repeat=SUITS):
+        if sum(counts) != missing or any(counts[i] > counts[i - 1] for i in tied):
+            continue
+        for picked in product(*[combinations(free[s], n) for s, n in zip(order, counts)]):
+            if any(counts[i] == counts[i - 1] and picked[i] > picked[i - 1] for i in tied):
+                continue
+            boards.append(board + [r * 4 + s for s, ranks in zip(order, picked) for r in ranks])
+            weight = 1
+            for start, end in runs:
+                # Distinct ways to hand the picked rank sets to the run
+                weight *= factorial(end - start)
+                for repeats in Counter(picked[start:end]).values():
+                    weight //= factorial(repeats)
+            weights.append(weight)
+
+    return np.array(boards, dtype=np.int32).reshape(len(boards), 5), np.array(weights, dtype=np.float64)
+
+
+def exact_equity(hand, table, opponents=None):
+
+    # opponents is either None for one unknown opponent, whose holdings are
+    # enumerated too, or a list of known opponent hands
+    hand = card_codes(hand)
+    table = card_codes(table)
+    known = [card_codes(o) for o in opponents] if opponents else []
+    remaining = remaining_codes(hand + table + sum(known, [])).tolist()
+    missing = 5 - len(table)
+
+    boards, weights = canonical_runouts([hand] + known, table, missing)
+    n_boards = len(boards)
+    hero = evaluate_batch(np.concatenate([np.broadcast_to(np.array(hand, dtype=np.int32), (n_boards, 2)), boards], axis=1))
+
+    if known:
+        opponent_ranks = np.stack([
+            evaluate_batch(np.concatenate([np.broadcast_to(np.array(o, dtype=np.int32), (n_boards, 2)), boards], axis=1))
+            for o in known
+        ], axis=1)
+        shares = showdown_shares(hero, opponent_ranks)
+
+    else:
+        # Every opponent hole pair that does not collide with the runout
+        holes = np.array(list(combinations(remaining, 2)), dtype=np.int32)
+        hole_masks = (np.int64(1) << holes[:, 0]) | (np.int64(1) << holes[:, 1])
+        runout_masks = np.bitwise_or.reduce(np.int64(1) << boards[:, len(table):].astype(np.int64), axis=1) \
+            if missing else np.zeros(n_boards, dtype=np.int64)
+        valid = (runout_masks[:, None] & hole_masks[None, :]) == 0
+        board_idx, hole_idx = np.nonzero(valid)
+
+        opponent_ranks = evaluate_batch(np.concatenate([holes[hole_idx], boards[board_idx]], axis=1))
+        row_shares = showdown_shares(hero[board_idx], opponent_ranks[:, None])
+        shares = np.bincount(board_idx, weights=row_shares, minlength=n_boards) / valid.sum(axis=1)
+
+    return {
+        'equity' : float((shares * weights).sum() / weights.sum()),
+        'boards' : int(weights.sum()),
+        'classes' : n_boards,
+    }
+
+
+if __name__ == '__main__':
+    import time
+    from Deck import Card
+
+    hand = [Card(14, 'S'), Card(13, 'S')]
+    table = [Card(12, 'S'), Card(7, 'H'), Card(2, 'D')]
+
+    start = time.perf_counter()
+    print(equity(hand, table, opponents=3, trials=100000))
+    print('elapsed', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    print(equity(hand, [], opponents=1, trials=200000, confidence=0.005, workers=1))
+    print('elapsed', time.perf_counter() - start)
+    shutdown_pool()
+
+    for street in (table, table + [Card(9, 'C')], table + [Card(9, 'C'), Card(5, 'S')]):
+        start = time.perf_counter()
+        print(exact_equity(hand, street))
+        print('elapsed', time.perf_counter() - start)
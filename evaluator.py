@@ -0,0 +1,296 @@
+import numpy as np
+
+# Hands are ranked by a single integer: category << 20 followed by up to five
+# 4-bit card ranks (0 = deuce ... 12 = ace) in order of significance.
+# A higher integer always means a better hand.
+
+HIGH_CARD = 0
+PAIR = 1
+TWO_PAIR = 2
+TREE_OF_A_KIND = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+FOUR_OF_A_KIND = 7
+STRAIGHT_FLUSH = 8
+
+HAND_TYPES = [
+    'HIGH_CARD',
+    'PAIR',
+    'TWO_PAIR',
+    'TREE_OF_A_KIND',
+    'STRAIGHT',
+    'FLUSH',
+    'FULL_HOUSE',
+    'FOUR_OF_A_KIND',
+    'STRAIGHT_FLUSH',
+]
+
+PRIMES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41]
+
+WHEEL = 0b1000000001111
+
+# Calls are only counted while COUNTING is set, see
+# instrumentation.count_evaluations; otherwise the cost is one check
+COUNTING = False
+EVALUATIONS = dict.fromkeys(['evaluate', 'evaluate_state', 'evaluate_batch', 'evaluate_batch_hands'], 0)
+
+
+def pack(category, ranks):
+    value = category << 20
+    shift = 16
+    for r in ranks:
+        value |= r << shift
+        shift -= 4
+    return value
+
+
+def category(rank):
+    return rank >> 20
+
+
+def hand_type(rank):
+    return HAND_TYPES[rank >> 20]
+
+
+def _straight_high(mask):
+    for high in range(12, 3, -1):
+        window = 0b11111 << (high - 4)
+        if mask & window == window:
+            return high
+    if mask & WHEEL == WHEEL:
+        return 3
+    return -1
+
+
+def _build_mask_tables():
+
+    # For every 13-bit rank mask: number of ranks, ranks from highest to
+    # lowest and the high card of the best straight (-1 if none)
+    popcount = [0] * (1 << 13)
+    top_ranks = [[] for _ in range(1 << 13)]
+    straight_high = [-1] * (1 << 13)
+
+    for mask in range(1, 1 << 13):
+        high = mask.bit_length() - 1
+        rest = mask & ~(1 << high)
+        popcount[mask] = popcount[rest] + 1
+        top_ranks[mask] = [high] + top_ranks[rest]
+        if popcount[mask] >= 5:
+            straight_high[mask] = _straight_high(mask)
+
+    return popcount, top_ranks, straight_high
+
+
+POPCOUNT, TOP_RANKS, STRAIGHT_HIGH = _build_mask_tables()
+
+
+def _rank_from_masks(ranks, pairs, trips, quads):
+
+    # ranks holds every rank present, pairs/trips/quads the ranks seen
+    # exactly two, three and four times
+    if quads:
+        top = TOP_RANKS[quads][0]
+        return pack(FOUR_OF_A_KIND, [top] + TOP_RANKS[ranks & ~(1 << top)][:1])
+
+    if trips:
+        top = TOP_RANKS[trips][0]
+        rest = (trips & ~(1 << top)) | pairs
+        if rest:
+            return pack(FULL_HOUSE, [top, TOP_RANKS[rest][0]])
+
+    if STRAIGHT_HIGH[ranks] >= 0:
+        return pack(STRAIGHT, [STRAIGHT_HIGH[ranks]])
+
+    if trips:
+        top = TOP_RANKS[trips][0]
+        return pack(TREE_OF_A_KIND, [top] + TOP_RANKS[ranks & ~(1 << top)][:2])
+
+    if POPCOUNT[pairs] >= 2:
+        first, second = TOP_RANKS[pairs][:2]
+        rest = ranks & ~(1 << first) & ~(1 << second)
+        return pack(TWO_PAIR, [first, second] + TOP_RANKS[rest][:1])
+
+    if pairs:
+        top = TOP_RANKS[pairs][0]
+        return pack(PAIR, [top] + TOP_RANKS[ranks & ~(1 << top)][:3])
+
+    return pack(HIGH_CARD, TOP_RANKS[ranks][:5])
+
+
+def _build_tables():
+
+    flush_rank = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if POPCOUNT[mask] >= 5:
+            if STRAIGHT_HIGH[mask] >= 0:
+                flush_rank[mask] = pack(STRAIGHT_FLUSH, [STRAIGHT_HIGH[mask]])
+            else:
+                flush_rank[mask] = pack(FLUSH, TOP_RANKS[mask][:5])
+
+    # Every multiset of 1-7 ranks has a unique product of primes
+    rank_by_product = {}
+
+    def add_rank(r, cards_left, product, ranks, pairs, trips, quads):
+        if ranks:
+            rank_by_product[product] = _rank_from_masks(ranks, pairs, trips, quads)
+        if not cards_left:
+            return
+        for nr in range(r, 13):
+            bit = 1 << nr
+            p = product
+            for n in range(1, 5 if cards_left > 4 else cards_left + 1):
+                p *= PRIMES[nr]
+                add_rank(nr + 1, cards_left - n, p,
+                         ranks | bit,
+                         pairs | bit if n == 2 else pairs,
+                         trips | bit if n == 3 else trips,
+                         quads | bit if n == 4 else quads)
+
+    add_rank(0, 7, 1, 0, 0, 0, 0)
+
+    return flush_rank, rank_by_product
+
+
+FLUSH_RANK, RANK_BY_PRODUCT = _build_tables()
+
+
+def evaluate(cards):
+
+    if COUNTING:
+        EVALUATIONS['evaluate'] += 1
+
+    product = 1
+    suit_masks = [0, 0, 0, 0]
+
+    for c in cards:
+        r = c >> 2
+        product *= PRIMES[r]
+        suit_masks[c & 3] |= 1 << r
+
+    # Same lookup as evaluate_state, inlined so every call counts once
+    for mask in suit_masks:
+        if POPCOUNT[mask] >= 5:
+            return FLUSH_RANK[mask]
+
+    return RANK_BY_PRODUCT[product]
+
+
+def evaluate_state(product, suit_masks):
+
+    # Rank from the prime product of the card ranks and the per-suit rank
+    # masks, for callers that keep those up to date card by card.
+    # With at most 7 cards a flush always beats whatever the other ranks make
+    if COUNTING:
+        EVALUATIONS['evaluate_state'] += 1
+    for mask in suit_masks:
+        if POPCOUNT[mask] >= 5:
+            return FLUSH_RANK[mask]
+
+    return RANK_BY_PRODUCT[product]
+
+
+def _build_batch_tables():
+
+    # TOP_K[k][mask] holds the k highest ranks of mask packed into nibbles,
+    # right aligned so they can be shifted into place
+    masks = np.arange(1 << 13, dtype=np.int32)
+    highest = np.array([r[0] if r else 0 for r in TOP_RANKS], dtype=np.int32)
+    rest = np.where(masks != 0, masks & ~(1 << highest), 0)
+
+    top_k = np.zeros((6, 1 << 13), dtype=np.int32)
+    for k in range(1, 6):
+        top_k[k] = np.where(masks != 0, (highest << (4 * (k - 1))) | top_k[k - 1][rest], 0)
+
+    return (
+        np.array(POPCOUNT, dtype=np.int32),
+        np.array(STRAIGHT_HIGH, dtype=np.int32),
+        np.array(FLUSH_RANK, dtype=np.int32),
+        top_k,
+    )
+
+
+POPCOUNT_NP, STRAIGHT_HIGH_NP, FLUSH_RANK_NP, TOP_K = _build_batch_tables()
+RANK_BITS = (1 << np.arange(13)).astype(np.int32)
+
+
+def evaluate_batch(cards):
+
+    # cards is an (N, k) integer array of card codes, 1 <= k <= 7
+    cards = np.asarray(cards, dtype=np.int32)
+    n, width = cards.shape
+    if COUNTING:
+        EVALUATIONS['evaluate_batch'] += 1
+        EVALUATIONS['evaluate_batch_hands'] += n
+    ranks = cards >> 2
+    suits = cards & 3
+    bits = RANK_BITS[ranks]
+
+    # Rank histogram, one row per hand
+    counts = np.bincount((ranks + 13 * np.arange(n, dtype=np.int32)[:, None]).ravel(), minlength=13 * n)
+    counts = counts.reshape(n, 13)
+
+    present = np.bitwise_or.reduce(bits, axis=1)
+    pairs = (counts == 2) @ RANK_BITS
+    trips = (counts == 3) @ RANK_BITS
+    quads = (counts == 4) @ RANK_BITS
+
+    # Suit masks; at most one suit can hold five cards
+    flush = np.zeros(n, dtype=np.int32)
+    for s in range(4):
+        suit_mask = np.bitwise_or.reduce(np.where(suits == s, bits, 0), axis=1)
+        flush |= np.where(POPCOUNT_NP[suit_mask] >= 5, suit_mask, 0)
+
+    highest = TOP_K[1]
+
+    top = highest[quads]
+    four_of_a_kind = (FOUR_OF_A_KIND << 20) | (top << 16) | (highest[present & ~RANK_BITS[top]] << 12)
+
+    top_trips = highest[trips]
+    full_house_pair = (trips & ~RANK_BITS[top_trips]) | pairs
+    full_house = (FULL_HOUSE << 20) | (top_trips << 16) | (highest[full_house_pair] << 12)
+
+    straight_high = STRAIGHT_HIGH_NP[present]
+    straight = (STRAIGHT << 20) | (straight_high << 16)
+
+    tree_of_a_kind = (TREE_OF_A_KIND << 20) | (top_trips << 16) | (TOP_K[2][present & ~RANK_BITS[top_trips]] << 8)
+
+    first = highest[pairs]
+    other_pairs = pairs & ~RANK_BITS[first]
+    second = highest[other_pairs]
+    two_pair = (TWO_PAIR << 20) | (first << 16) | (second << 12) \
+        | (highest[present & ~RANK_BITS[first] & ~RANK_BITS[second]] << 8)
+
+    pair = (PAIR << 20) | (first << 16) | (TOP_K[3][present & ~RANK_BITS[first]] << 4)
+
+    high_card = TOP_K[5][present]
+
+    result = np.select(
+        [quads != 0, (trips != 0) & (full_house_pair != 0), straight_high >= 0, trips != 0, other_pairs != 0, pairs != 0],
+        [four_of_a_kind, full_house, straight, tree_of_a_kind, two_pair, pair],
+        high_card,
+    )
+
+    return np.where(flush != 0, FLUSH_RANK_NP[flush], result)
+
+
+if __name__ == '__main__':
+    import time
+    from Deck import Deck
+
+    deck = Deck()
+    deck.shuffle()
+    hand = deck.draw(7)
+    rank = evaluate([c.code for c in hand])
+    print(hand, hand_type(rank), hex(rank))
+
+    codes = [c.code for c in hand]
+    start = time.perf_counter()
+    for _ in range(100000):
+        evaluate(codes)
+    print('evaluations/s', int(100000 / (time.perf_counter() - start)))
+
+    batch = np.array([np.random.permutation(52)[:7] for _ in range(100000)])
+    start = time.perf_counter()
+    evaluate_batch(batch)
+    print('batch evaluations/s', int(100000 / (time.perf_counter() - start)))
@@ -0,0 +1,538 @@
+import json
+import os
+import struct
+import zlib
+from itertools import chain
+import numpy as np
+
+# File layout: an 8 byte header followed by chunks. Every chunk starts with
+# CHUNK_HEADER; a data chunk then holds the columns of HANDS, SEATS, ACTIONS
+# and CARDS one after the other, each padded to 8 bytes, optionally zlib
+# compressed as a whole. Registry chunks hold a JSON list of new
+# [name, class] players; their position in the file is the player index.
+#
+# Only what happened is stored. Hand ids, seat numbers, pots, stacks,
+# contributions, folds, to_call and the split of the dealt cards into hole
+# cards and boards are worked out by the reader, one chunk at a time, so
+# writing a chunk is little more than copying the buffers out.
+MAGIC = b'PKHH\x01\x00\x00\x00'
+CHUNK_HEADER = struct.Struct('<cB2xIIIIIQII')
+DATA, REGISTRY = b'D', b'R'
+
+HANDS = [
+    ('game', 'i'), ('start', 'i'), ('dealer', 'B'), ('seats', 'B'), ('actions', 'H'), ('cards', 'B'), ('showdown', 'B'),
+]
+SEATS = [('player', 'H'), ('payout', 'i')]
+ACTIONS = [('seat', 'B'), ('street', 'B'), ('action', 'B'), ('amount', 'i')]
+CARDS = [('card', 'b')]
+
+# Action codes follow PokerEnv.possibleActions, blinds come after
+ACTION_CODES = {'CHECK': 0, 'BET': 1, 'CALL': 2, 'FOLD': 3, 'SMALL_BLIND': 4, 'BIG_BLIND': 5}
+STREET_NAMES = ['PREFLOP', 'FLOP', 'TURN', 'RIVER']
+STREET_BY_BOARD = np.array([0, 0, 0, 1, 2, 3])
+
+# Buffered actions are packed into one int each, amount << 16 | code << 12 |
+# board cards << 8 | seat, which keeps the hook to a single append
+ACTION_BITS = {kind: code << 12 for kind, code in ACTION_CODES.items()}
+
+# Fields buffered per hand: game, starting stack of the game, dealer,
+# seating, end of the hand's actions, number of cards dealt, showdown
+HAND_FIELDS = 7
+
+
+def _pad(n):
+    return -n % 8
+
+
+def _ints(values, fields=1):
+    values = np.fromiter(values, np.int64, len(values))
+    return values.reshape(-1, fields) if fields > 1 else values
+
+
+class HandHistoryRecorder:
+
+    def __init__(self, path, chunk_hands=4096, compress=False, level=1):
+
+        # Appends to path. The hooks only extend flat lists of plain ints,
+        # which a flush of chunk_hands complete hands turns into columns.
+        # hand_id is the id of the first hand not written yet.
+        self.path = path
+        self.chunk_hands = chunk_hands
+        self.compress = compress
+        self.level = level
+
+        self.hand_id = 0
+        self.game = -1
+        self.players = {}
+        self._stack = 0
+        self._game_start = None
+        self._registered = 0
+        self._known = {}
+        self._new = []
+        self._written_players = 0
+        self._hands = []
+        self._cards = []
+        self._payouts = []
+        self._actions = []
+        self._flush_at = chunk_hands * HAND_FIELDS
+
+        # Seat order of the current table as player ids; hands refer to it
+        # by its index in _seatings
+        self._seated = []
+        self._seatings = []
+        self._seating = -1
+
+        if os.path.exists(path) and os.path.getsize(path):
+            self._resume()
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC)
+
+    def _resume(self):
+
+        # Continue hand, game and player numbering after what is on disk.
+        # Players already registered keep their ids when they show up again.
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise Exception(f'{self.path} is not a hand history file.')
+            while True:
+                header = f.read(CHUNK_HEADER.size)
+                if not header:
+                    break
+                kind, compressed, n_hands, _, _, _, stored, first_hand, last_game, _ = CHUNK_HEADER.unpack(header)
+                if kind == REGISTRY:
+                    for name, cls in json.loads(f.read(stored)):
+                        self._known.setdefault((name, cls), []).append(self._registered)
+                        self._registered += 1
+                    f.seek(_pad(stored), 1)
+                else:
+                    self.hand_id = first_hand + n_hands
+                    self.game = max(self.game, last_game)
+                    f.seek(stored + _pad(stored), 1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def new_game(self, stack):
+        # Every seat starts the game with stack. A game only takes a number
+        # once a hand of it is recorded, so resetting an environment that
+        # has not played yet does not leave an empty game behind.
+        hands = self.hand_id + len(self._hands) // HAND_FIELDS
+        if hands != self._game_start:
+            self.game += 1
+            self._game_start = hands
+        self._stack = stack
+
+    def action(self, seat, board_len, kind, amount):
+        # kind is the action type, amount what it put in the pot
+        self._actions.append(amount << 16 | ACTION_BITS[kind] | board_len << 8 | seat)
+
+    def blinds(self, small_seat, small, big_seat, big):
+        # Both posts in one call, as SMALL_BLIND and BIG_BLIND actions
+        self._actions += (small << 16 | 4 << 12 | small_seat, big << 16 | 5 << 12 | big_seat)
+
+    def _player_id(self, player):
+        # The same player object keeps one id; a new object takes over the
+        # id of a player with its name and class from an earlier session
+        known = self._known.get((str(player.id), player.__class__.__name__))
+        if known:
+            return known.pop(0)
+        self._new.append(player)
+        return self._registered + len(self._new) - 1
+
+    def end_hand(self, players, dealer, cards, payouts, showdown):
+
+        # Called after settling but before payouts reach the stacks. cards
+        # are the codes in dealing order, two per seat and then the board,
+        # as returned by Deck.dealt.
+        if players != self._seated:
+            ids = self.players
+            for p in players:
+                if p not in ids:
+                    ids[p] = self._player_id(p)
+            self._seated = list(players)
+            self._seatings.append([ids[p] for p in players])
+            self._seating = len(self._seatings) - 1
+        self._cards += cards
+        self._payouts += payouts
+        self._hands += (self.game, self._stack, dealer, self._seating, len(self._actions), len(cards), showdown)
+        if len(self._hands) >= self._flush_at:
+            self.flush()
+
+    def _columns(self):
+
+        hands = _ints(self._hands, HAND_FIELDS)
+        actions = _ints(self._actions)
+
+        sizes = np.array([len(s) for s in self._seatings], dtype=np.int64)
+        seated = _ints(list(chain.from_iterable(self._seatings)))
+        seating = hands[:, 3]
+        n_seats = sizes[seating]
+        first_seat = np.cumsum(n_seats) - n_seats
+        seat = np.arange(len(self._payouts)) - np.repeat(first_seat, n_seats)
+
+        hand_columns = {
+            'game' : hands[:, 0], 'start' : hands[:, 1], 'dealer' : hands[:, 2], 'seats' : n_seats,
+            'actions' : np.diff(hands[:, 4], prepend=0), 'cards' : hands[:, 5], 'showdown' : hands[:, 6],
+        }
+        seat_columns = {
+            'player' : seated[np.repeat(np.cumsum(sizes)[seating] - n_seats, n_seats) + seat],
+            'payout' : _ints(self._payouts),
+        }
+        action_columns = {
+            'seat' : actions & 0xff, 'street' : STREET_BY_BOARD[actions >> 8 & 0xf],
+            'action' : actions >> 12 & 0xf, 'amount' : actions >> 16,
+        }
+        # Card codes fit a byte, and bytes() reads a list of them faster than
+        # fromiter
+        card_columns = {'card' : np.frombuffer(bytes(self._cards), np.uint8)}
+
+        return (hand_columns, HANDS), (seat_columns, SEATS), (action_columns, ACTIONS), (card_columns, CARDS)
+
+    def _write_chunk(self, kind, count, counts, payload, first_hand=0, last_game=0):
+        raw = len(payload)
+        compressed = self.compress and kind == DATA
+        if compressed:
+            payload = zlib.compress(payload, self.level)
+        self.file.write(CHUNK_HEADER.pack(kind, compressed, count, counts[0], counts[1], raw, len(payload),
+                                          first_hand, last_game, counts[2]))
+        self.file.write(payload)
+        self.file.write(b'\0' * _pad(len(payload)))
+
+    def flush(self):
+
+        # New players go out before the first chunk that refers to them
+        if len(self._new) > self._written_players:
+            new = self._new[self._written_players:]
+            payload = json.dumps([[str(p.id), p.__class__.__name__] for p in new]).encode()
+            self._write_chunk(REGISTRY, len(new), (0, 0, 0), payload)
+            self._written_players = len(self._new)
+
+        if self._hands:
+            parts = []
+            for columns, table in self._columns():
+                for name, t in table:
+                    data = columns[name].astype(t).tobytes()
+                    parts.append(data)
+                    parts.append(b'\0' * _pad(len(data)))
+            n_hands = len(self._hands) // HAND_FIELDS
+            counts = (len(self._payouts), len(self._actions), len(self._cards))
+            self._write_chunk(DATA, n_hands, counts, b''.join(parts), self.hand_id, self.game)
+
+            self.hand_id += n_hands
+            for rows in (self._hands, self._cards, self._payouts, self._actions):
+                del rows[:]
+            self._seatings = [self._seatings[self._seating]]
+            self._seating = 0
+
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def _code(value, names):
+    return names.index(value) if isinstance(value, str) else value
+
+
+class HandHistoryReader:
+
+    def __init__(self, path):
+
+        # Maps the file and indexes the chunk headers. Stored columns are
+        # numpy views of the map, or of one decompressed chunk at a time;
+        # derived columns are worked out per chunk as it is read.
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if self.data[:len(MAGIC)].tobytes() != MAGIC:
+            raise Exception(f'{path} is not a hand history file.')
+
+        self.players = []
+        self.chunk_index = []
+        offset = len(MAGIC)
+        while offset < len(self.data):
+            kind, compressed, n_hands, n_seats, n_actions, _, stored, first_hand, _, n_cards = CHUNK_HEADER.unpack_from(self.data, offset)
+            start = offset + CHUNK_HEADER.size
+            if kind == REGISTRY:
+                self.players += json.loads(self.data[start:start + stored].tobytes())
+            else:
+                self.chunk_index.append((start, stored, compressed, n_hands, n_seats, n_actions, n_cards, first_hand))
+            offset = start + stored + _pad(stored)
+
+        self.classes = sorted({cls for _, cls in self.players})
+        self.player_class = np.array([self.classes.index(cls) for _, cls in self.players], dtype=np.int64)
+
+    def __len__(self):
+        return sum(chunk[3] for chunk in self.chunk_index)
+
+    def player_ids(self, player):
+        # A player index, a name or a class name; names can repeat across games
+        if not isinstance(player, str):
+            return np.array([player])
+        return np.array([i for i, (name, cls) in enumerate(self.players) if player in (name, cls)])
+
+    def chunks(self):
+
+        # Yields {'hands': ..., 'seats': ..., 'actions': ...} column dicts,
+        # one chunk at a time. Stacks carry over from chunk to chunk, so
+        # chunks are always read from the start of the file.
+        carry = {}
+        for start, stored, compressed, n_hands, n_seats, n_actions, n_cards, first_hand in self.chunk_index:
+            data = self.data[start:start + stored]
+            if compressed:
+                data = np.frombuffer(zlib.decompress(data), dtype=np.uint8)
+            offset = 0
+            chunk = {}
+            for key, table, n in (('hands', HANDS, n_hands), ('seats', SEATS, n_seats),
+                                  ('actions', ACTIONS, n_actions), ('cards', CARDS, n_cards)):
+                columns = chunk[key] = {}
+                for name, t in table:
+                    size = n * np.dtype(t).itemsize
+                    columns[name] = data[offset:offset + size].view(t)
+                    offset += size + _pad(size)
+            yield self._derive(chunk, first_hand, carry)
+
+    def _derive(self, chunk, first_hand, carry):
+
+        hands, seats, actions = chunk['hands'], chunk['seats'], chunk['actions']
+        cards = chunk.pop('cards')['card']
+        n_seats = hands['seats'].astype(np.int64)
+        n_actions = hands['actions'].astype(np.int64)
+        showdown = hands['showdown'].astype(bool)
+        player = seats['player']
+        payout = seats['payout']
+
+        hand = first_hand + np.arange(len(n_seats))
+        first_seat = np.cumsum(n_seats) - n_seats
+        seat = np.arange(len(player)) - np.repeat(first_seat, n_seats)
+
+        action_hand = np.repeat(hand, n_actions)
+        action_seat = actions['seat'].astype(np.int64)
+        street = actions['street']
+        kind = actions['action']
+        amount = actions['amount'].astype(np.int64)
+        seat_row = np.repeat(first_seat, n_actions) + action_seat
+
+        # The pot before an action is the running total of the hand so far
+        total = np.cumsum(amount)
+        first_action = np.repeat(np.cumsum(n_actions) - n_actions, n_actions)
+        pot = total - amount - (total[first_action] - amount[first_action])
+
+        # What the seat had to put in to call: the highest street total so
+        # far minus its own, both replayed per street without a Python loop
+        new_street = np.ones(len(amount), dtype=bool)
+        new_street[1:] = (action_hand[1:] != action_hand[:-1]) | (street[1:] != street[:-1])
+        group = np.cumsum(new_street) - 1
+
+        order = np.argsort(group * 16 + action_seat, kind='stable')
+        key = (group * 16 + action_seat)[order]
+        before = np.cumsum(amount[order]) - amount[order]
+        first = np.ones(len(key), dtype=bool)
+        first[1:] = key[1:] != key[:-1]
+        own = np.empty_like(before)
+        own[order] = before - before[np.maximum.accumulate(np.where(first, np.arange(len(key)), 0))]
+
+        scale = 1 << 32
+        highest = np.maximum.accumulate(own + amount + group * scale)
+        highest = np.concatenate(([0], highest[:-1])) - group * scale
+        to_call = np.where(new_street | (kind >= ACTION_CODES['SMALL_BLIND']), 0, np.maximum(highest - own, 0))
+
+        contributed = np.bincount(seat_row, weights=amount, minlength=len(player)).astype(np.int64)
+        folded = np.bincount(seat_row[kind == ACTION_CODES['FOLD']], minlength=len(player)) > 0
+
+        game = np.repeat(hands['game'], n_seats)
+        stack = self._stacks(player, game, np.repeat(hands['start'].astype(np.int64), n_seats), payout - contributed, carry)
+
+        # Cards come two per seat and then the board, hand after hand
+        n_board = hands['cards'] - 2 * n_seats
+        first_card = np.cumsum(hands['cards'], dtype=np.int64) - hands['cards']
+        hole = np.repeat(first_card, n_seats) + 2 * seat
+        board = first_card + 2 * n_seats
+
+        hands = dict(hands, hand=hand, pot=np.add.reduceat(contributed, first_seat))
+        for i in range(5):
+            dealt = i < n_board
+            hands[f'board{i}'] = np.where(dealt, cards[np.where(dealt, board + i, 0)], -1)
+
+        seats = dict(seats, hand=np.repeat(hand, n_seats), seat=seat, hole0=cards[hole], hole1=cards[hole + 1],
+                     stack=stack, contributed=contributed, folded=folded, showdown=np.repeat(showdown, n_seats) & ~folded)
+
+        actions = dict(actions, hand=action_hand, player=player[seat_row], pot=pot, to_call=to_call)
+
+        return {'hands' : hands, 'seats' : seats, 'actions' : actions}
+
+    @staticmethod
+    def _stacks(player, game, start, delta, carry):
+
+        # A player starts a hand with what it started the previous one with
+        # plus delta, the net result of that hand. Rows are grouped per
+        # player and game; each group starts from the game's starting stack
+        # or from where the last chunk left the player.
+        order = np.argsort(player, kind='stable')
+        player, game, start, delta = player[order], game[order], start[order], delta[order]
+        first = np.ones(len(player), dtype=bool)
+        first[1:] = (player[1:] != player[:-1]) | (game[1:] != game[:-1])
+        starts = np.flatnonzero(first)
+        ends = np.append(starts[1:], len(player)) - 1
+
+        base = start[starts]
+        for i, key in enumerate(zip(player[starts].tolist(), game[starts].tolist())):
+            if key in carry:
+                base[i] = carry[key]
+
+        total = np.cumsum(delta)
+        group = np.cumsum(first) - 1
+        before = total - delta - (total[starts] - delta[starts])[group]
+        stack = np.empty_like(delta)
+        stack[order] = base[group] + before
+
+        # Only the last game of the chunk can carry on into the next one
+        after = base + total[ends] - (total[starts] - delta[starts])
+        last = game.max() if len(game) else -1
+        carry.clear()
+        carry.update((k, s) for k, s in zip(zip(player[ends].tolist(), game[ends].tolist()), after.tolist()) if k[1] == last)
+        return stack
+
+    def _action_mask(self, actions, street, player, action, min_pot, max_pot):
+        mask = np.ones(len(actions['hand']), dtype=bool)
+        if street is not None:
+            mask &= actions['street'] == _code(street, STREET_NAMES)
+        if player is not None:
+            mask &= np.isin(actions['player'], self.player_ids(player))
+        if action is not None:
+            mask &= actions['action'] == ACTION_CODES.get(action, action)
+        if min_pot is not None:
+            mask &= actions['pot'] >= min_pot
+        if max_pot is not None:
+            mask &= actions['pot'] <= max_pot
+        return mask
+
+    def actions(self, street=None, player=None, action=None, min_pot=None, max_pot=None):
+
+        # Action columns per chunk, filtered on the street and pot the action
+        # was made on, who made it and its type
+        for chunk in self.chunks():
+            actions = chunk['actions']
+            mask = self._action_mask(actions, street, player, action, min_pot, max_pot)
+            if mask.any():
+                yield {name: column[mask] for name, column in actions.items()}
+
+    def hands(self, street=None, player=None, action=None, min_pot=None, max_pot=None):
+
+        # Hand columns per chunk for hands that reached street, were played
+        # by player and, when action is given, had such an action (by player
+        # if both are given). The pot bounds apply to the final pot.
+        street = _code(street, STREET_NAMES) if street is not None else 0
+        for chunk in self.chunks():
+            hands, seats = chunk['hands'], chunk['seats']
+            first = hands['hand'][0] if len(hands['hand']) else 0
+            mask = np.ones(len(hands['hand']), dtype=bool)
+            if street:
+                # The flop, turn and river fill board2, board3 and board4
+                mask &= hands[f'board{street + 1}'] >= 0
+            if player is not None:
+                played = np.zeros(len(mask), dtype=bool)
+                played[seats['hand'][np.isin(seats['player'], self.player_ids(player))] - first] = True
+                mask &= played
+            if action is not None:
+                actions = chunk['actions']
+                made = np.zeros(len(mask), dtype=bool)
+                made[actions['hand'][self._action_mask(actions, None, player, action, None, None)] - first] = True
+                mask &= made
+            if min_pot is not None:
+                mask &= hands['pot'] >= min_pot
+            if max_pot is not None:
+                mask &= hands['pot'] <= max_pot
+            if mask.any():
+                yield {name: column[mask] for name, column in hands.items()}
+
+    def stats(self):
+
+        # Per Player subclass over every recorded seat:
+        #   vpip      share of hands with a preflop call or bet, blinds aside
+        #   pfr       share of hands with a preflop bet
+        #   showdown  share of showdowns that ended with more chips than were put in
+        #   chip_ev   average chips won or lost per hand
+        n = len(self.classes)
+        totals = {key: np.zeros(n) for key in ('hands', 'vpip', 'pfr', 'showdowns', 'showdown_wins', 'net')}
+
+        for chunk in self.chunks():
+            hands, seats, actions = chunk['hands'], chunk['seats'], chunk['actions']
+            if not len(hands['hand']):
+                continue
+            cls = self.player_class[seats['player']]
+
+            # Seat row of every action: the hand's first seat row plus the seat
+            first_row = np.cumsum(hands['seats'], dtype=np.int64) - hands['seats']
+            row = first_row[actions['hand'] - hands['hand'][0]] + actions['seat']
+            preflop = actions['street'] == 0
+            voluntary = np.zeros(len(cls), dtype=bool)
+            voluntary[row[preflop & ((actions['action'] == ACTION_CODES['CALL']) | (actions['action'] == ACTION_CODES['BET']))]] = True
+            raised = np.zeros(len(cls), dtype=bool)
+            raised[row[preflop & (actions['action'] == ACTION_CODES['BET'])]] = True
+
+            net = seats['payout'].astype(np.int64) - seats['contributed']
+            showdown = seats['showdown'].astype(bool)
+            totals['hands'] += np.bincount(cls, minlength=n)
+            totals['vpip'] += np.bincount(cls, weights=voluntary, minlength=n)
+            totals['pfr'] += np.bincount(cls, weights=raised, minlength=n)
+            totals['showdowns'] += np.bincount(cls, weights=showdown, minlength=n)
+            totals['showdown_wins'] += np.bincount(cls, weights=showdown & (net > 0), minlength=n)
+            totals['net'] += np.bincount(cls, weights=net, minlength=n)
+
+        result = {}
+        for i, cls in enumerate(self.classes):
+            hands = totals['hands'][i]
+            showdowns = totals['showdowns'][i]
+            result[cls] = {
+                'hands' : int(hands),
+                'vpip' : float(totals['vpip'][i] / hands) if hands else 0.0,
+                'pfr' : float(totals['pfr'][i] / hands) if hands else 0.0,
+                'showdown' : float(totals['showdown_wins'][i] / showdowns) if showdowns else 0.0,
+                'chip_ev' : float(totals['net'][i] / hands) if hands else 0.0
+            }
+        return result
+
+
+if __name__ == '__main__':
+    import tempfile
+    import time
+    from Player import RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
+    from simulation import simulate
+
+    lineup = [RandomPlayer, AgressivePlayer, SoftRandomPlayer, TightPlayer]
+    path = os.path.join(tempfile.mkdtemp(), 'hands.phh')
+
+    # Best of a few interleaved runs, a quick look; benchmark.py recording
+    # pairs more runs on the same games for a steadier figure
+    rates = {}
+    sizes = {}
+    for _ in range(3):
+        for compress in (None, False, True):
+            if os.path.exists(path):
+                os.remove(path)
+            players = [cls(f'{cls.__name__}-{i}') for i, cls in enumerate(lineup)]
+            start = time.perf_counter()
+            if compress is None:
+                result = simulate(players, 100, 2, 500, seed=0)
+            else:
+                with HandHistoryRecorder(path, compress=compress) as recorder:
+                    result = simulate(players, 100, 2, 500, seed=0, recorder=recorder)
+            rates[compress] = max(rates.get(compress, 0), result['hands'] / (time.perf_counter() - start))
+            sizes[compress] = os.path.getsize(path) if os.path.exists(path) else 0
+
+    for compress, rate in rates.items():
+        print('recording' if compress is not None else 'no recording', 'compressed' if compress else '',
+              int(rate), 'hands/s', f'{100 * (rates[None] / rate - 1):.1f}% overhead', sizes[compress], 'bytes')
+
+    reader = HandHistoryReader(path)
+    for cls, stats in reader.stats().items():
+        print(cls, stats)
+    rivers = sum(len(hands['hand']) for hands in reader.hands(street='RIVER', player='TightPlayer', min_pot=40))
+    print(rivers, 'of', len(reader), 'hands saw a river with a TightPlayer and a pot of 40 or more')
@@ -0,0 +1,172 @@
+import asyncio
+import time
+import numpy as np
+from collections import Counter
+
+
+class InferenceServer:
+
+    def __init__(self, policy, obs_dim, max_batch=256, max_wait=0.002):
+
+        # policy maps an (n, obs_dim) float32 array to n action indexes. Pending
+        # requests are answered together once max_batch of them are queued or
+        # the oldest one has waited max_wait seconds.
+        self.policy = policy
+        self.obs_dim = obs_dim
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch = np.zeros((max_batch, obs_dim), dtype=np.float32)
+        self.queue = None
+        self.task = None
+
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.total_latency = 0.0
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def metrics(self):
+        return {
+            'requests' : self.requests,
+            'batches' : self.batches,
+            'mean_batch_size' : self.requests / self.batches if self.batches else 0.0,
+            'batch_sizes' : dict(sorted(self.batch_sizes.items())),
+            'queue_depth' : self.queue_depth,
+            'max_queue_depth' : self.max_queue_depth,
+            'mean_latency' : self.total_latency / self.requests if self.requests else 0.0,
+        }
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.serve())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    async def act(self, observation):
+        if self.task is None or self.task.done():
+            raise Exception('InferenceServer is not running.')
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((observation, future, time.perf_counter()))
+        return await future
+
+    async def serve(self):
+
+        loop = asyncio.get_running_loop()
+        pending = []
+
+        try:
+            while True:
+                pending.clear()
+                pending.append(await self.queue.get())
+                self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+                deadline = loop.time() + self.max_wait
+
+                while len(pending) < self.max_batch:
+                    if not self.queue.empty():
+                        pending.append(self.queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                n = len(pending)
+                try:
+                    for i, (observation, _, _) in enumerate(pending):
+                        self.batch[i] = observation
+                    actions = self.policy(self.batch[:n])
+
+                    now = time.perf_counter()
+                    for (_, future, queued), action in zip(pending, actions):
+                        self.total_latency += now - queued
+                        if not future.done():
+                            future.set_result(int(action))
+                except Exception as exc:
+                    # A failed batch fails its own requests, the server
+                    # carries on with the next one
+                    for _, future, _ in pending:
+                        if not future.done():
+                            future.set_exception(exc)
+                    continue
+
+                self.requests += n
+                self.batches += 1
+                self.batch_sizes[n] += 1
+
+        finally:
+            # Once stopped nothing would ever answer the requests still
+            # waiting, so they are cancelled rather than left hanging
+            for _, future, _ in pending:
+                future.cancel()
+            while not self.queue.empty():
+                self.queue.get_nowait()[1].cancel()
+
+
+def network_policy(net):
+
+    # Greedy actions of a DeepQNetwork, one no-grad forward pass per batch
+    import torch as T
+
+    def policy(batch):
+        with T.inference_mode():
+            return T.argmax(net.forward(T.from_numpy(batch)), dim=1).cpu().numpy()
+
+    return policy
+
+
+async def play_table(server, env, encoder, decisions):
+
+    # Drives one PokerEnv; its scripted players act inline and the agent's
+    # decisions go through the shared server
+    from observation import decode_action
+
+    state = np.zeros(encoder.obs_dim, dtype=np.float32)
+    obs = env.reset()
+    made = 0
+
+    while made < decisions:
+        encoder.encode(obs, state)
+        action = await server.act(state)
+        obs, reward, done, info = env.step(decode_action(action, obs, env.agent.stack))
+        made += 1
+        if done:
+            obs = env.reset()
+
+
+if __name__ == '__main__':
+    from model import DeepQNetwork
+    from observation import ObservationEncoder, obs_dim
+    from Player import AgressivePlayer, SoftRandomPlayer, TightPlayer
+    from PokerEnv import PokerEnv
+
+    tables = 64
+    opponents = [AgressivePlayer, SoftRandomPlayer, TightPlayer]
+    num_players = len(opponents) + 1
+    net = DeepQNetwork(0.0, num_players)
+
+    async def main():
+        server = InferenceServer(network_policy(net), obs_dim(num_players), max_batch=64, max_wait=0.001)
+        server.start()
+
+        envs = [PokerEnv([cls(f'{cls.__name__}-{i}') for i, cls in enumerate(opponents)], 100, 2) for _ in range(tables)]
+        start = time.perf_counter()
+        await asyncio.gather(*[play_table(server, env, ObservationEncoder(num_players, num_players * 100), 200) for env in envs])
+        elapsed = time.perf_counter() - start
+        await server.stop()
+
+        print(server.metrics())
+        print('decisions/s', int(server.requests / elapsed))
+
+    asyncio.run(main())
@@ -0,0 +1,208 @@
+import sys
+from time import perf_counter_ns
+import evaluator
+
+# Phases follow the environments' states; START covers the shuffle, the
+# blinds and dealing the hole cards
+PHASES = ['START', 'PREFLOP', 'FLOP', 'TURN', 'RIVER', 'WRAP_UP']
+
+# Decision latencies go into power of two buckets of nanoseconds: bucket b
+# holds durations in [2 ** (b - 1), 2 ** b)
+BUCKETS = 48
+
+_counters = 0
+
+
+def count_evaluations(enable=True):
+
+    # Turns on evaluator's own call counters while at least one Profiler
+    # asks for them; the counts are process wide
+    global _counters
+
+    _counters += 1 if enable else -1
+    if _counters < 0:
+        raise Exception('count_evaluations(False) without a matching count_evaluations().')
+    evaluator.COUNTING = _counters > 0
+
+
+class Profiler:
+
+    def __init__(self, evaluations=False, allocations=True):
+
+        # Handed to an environment as profiler=...; the environment reports
+        # phase changes through enter() and lets the profiler time the
+        # decisions of its bots through act(). Time spent outside the
+        # environment, such as waiting for an agent's step, is not counted.
+        # allocations samples sys.getallocatedblocks() at the start and end
+        # of every hand, outside the phase times. That is the net number of
+        # blocks a hand leaves behind, not how many it allocated: a hand
+        # that allocates a lot and frees it all again retains about zero.
+        # evaluations turns on the evaluator's call counters, process wide,
+        # until close().
+        self.phase_ns = dict.fromkeys(PHASES, 0)
+        self.decision_ns = {}
+        self.histograms = {}
+        self.hands = 0
+        self.retained_blocks = 0
+
+        self.current = None
+        self.mark = None
+        self._hand_blocks = None
+        self.allocations = allocations
+        self.evaluations = evaluations
+        self._evaluations_start = dict(evaluator.EVALUATIONS)
+        if evaluations:
+            count_evaluations(True)
+
+    def close(self):
+        if self.evaluations:
+            self.evaluations_total = self.evaluation_counts()
+            count_evaluations(False)
+            self.evaluations = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def enter(self, phase):
+
+        now = perf_counter_ns()
+        if self.mark is not None and self.current is not None:
+            self.phase_ns[self.current] += now - self.mark
+
+        # A hand is counted once it has been through WRAP_UP, when the next
+        # one starts or when the environment returns. The environments
+        # also enter START when they are built, which starts nothing.
+        if phase == 'START':
+            self._end_hand()
+            if self.allocations:
+                self._hand_blocks = sys.getallocatedblocks()
+                now = perf_counter_ns()
+        self.current = phase
+        self.mark = now
+
+    def _end_hand(self):
+        if self.current == 'WRAP_UP':
+            self.hands += 1
+            if self.allocations and self._hand_blocks is not None:
+                self.retained_blocks += sys.getallocatedblocks() - self._hand_blocks
+
+    def pause(self):
+        if self.mark is not None and self.current is not None:
+            self.phase_ns[self.current] += perf_counter_ns() - self.mark
+        self.mark = None
+        self._end_hand()
+        if self.current == 'WRAP_UP':
+            self.current = None
+
+    def resume(self):
+        self.mark = perf_counter_ns()
+
+    def act(self, player, game_state):
+
+        start = perf_counter_ns()
+        action = player.act(game_state)
+        elapsed = perf_counter_ns() - start
+
+        cls = player.__class__.__name__
+        histogram = self.histograms.get(cls)
+        if histogram is None:
+            histogram = self.histograms[cls] = [0] * BUCKETS
+        histogram[min(elapsed.bit_length(), BUCKETS - 1)] += 1
+        key = (self.current, cls)
+        self.decision_ns[key] = self.decision_ns.get(key, 0) + elapsed
+        return action
+
+    def evaluation_counts(self):
+        if not self.evaluations:
+            return getattr(self, 'evaluations_total', dict.fromkeys(evaluator.EVALUATIONS, 0))
+        counts = evaluator.EVALUATIONS
+        return {name: counts[name] - self._evaluations_start[name] for name in counts}
+
+    def stats(self):
+
+        hands = max(self.hands, 1)
+        total = sum(self.phase_ns.values()) or 1
+        phases = {
+            phase: {'seconds' : ns / 1e9, 'share' : ns / total, 'us_per_hand' : ns / hands / 1e3}
+            for phase, ns in self.phase_ns.items()
+        }
+
+        decisions = {}
+        for cls, histogram in self.histograms.items():
+            count = sum(histogram)
+            ns = sum(v for (_, c), v in self.decision_ns.items() if c == cls)
+            decisions[cls] = {
+                'count' : count,
+                'mean_us' : ns / count / 1e3,
+                'p50_us' : self._percentile(histogram, 0.5),
+                'p99_us' : self._percentile(histogram, 0.99),
+                'histogram_us' : {2 ** b / 1e3 : n for b, n in enumerate(histogram) if n}
+            }
+
+        evaluations = self.evaluation_counts()
+        return {
+            'hands' : self.hands,
+            'phases' : phases,
+            'decisions' : decisions,
+            'evaluations' : evaluations,
+            'evaluations_per_hand' : {name: n / hands for name, n in evaluations.items()},
+            # Blocks still held at the end of a hand that were not held at its
+            # start (net, not allocations made); steadily above zero is state
+            # growing from hand to hand
+            'retained_blocks_per_hand' : self.retained_blocks / hands if self.allocations else None
+        }
+
+    @staticmethod
+    def _percentile(histogram, q):
+        # Upper edge of the bucket holding the q-th decision
+        target = q * sum(histogram)
+        seen = 0
+        for b, n in enumerate(histogram):
+            seen += n
+            if n and seen >= target:
+                return 2 ** b / 1e3
+        return 0.0
+
+    def folded(self, root='PokerEnv'):
+
+        # Folded stacks in microseconds, as read by flamegraph.pl, inferno or
+        # speedscope: root;PHASE for the phase's own time and
+        # root;PHASE;act;Class for the decisions made in it
+        lines = []
+        for phase, ns in self.phase_ns.items():
+            decided = 0
+            for (p, cls), d in sorted(self.decision_ns.items()):
+                if p == phase:
+                    decided += d
+                    if d >= 1000:
+                        lines.append(f'{root};{phase};act;{cls} {d // 1000}')
+            own = (ns - decided) // 1000
+            if own > 0:
+                lines.append(f'{root};{phase} {own}')
+        return '\n'.join(lines) + '\n'
+
+    def write_folded(self, path, root='PokerEnv'):
+        with open(path, 'w') as f:
+            f.write(self.folded(root))
+
+
+if __name__ == '__main__':
+    import json
+    import time
+    from Player import RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
+    from simulation import simulate
+
+    lineup = [RandomPlayer, AgressivePlayer, SoftRandomPlayer, TightPlayer]
+
+    for profiler in (None, Profiler(evaluations=True)):
+        players = [cls(f'{cls.__name__}-{i}') for i, cls in enumerate(lineup)]
+        start = time.perf_counter()
+        result = simulate(players, 100, 2, 300, seed=0, profiler=profiler)
+        print('profiled' if profiler else 'plain', int(result['hands'] / (time.perf_counter() - start)), 'hands/s')
+
+    profiler.close()
+    print(json.dumps(profiler.stats(), indent=2))
+    print(profiler.folded('Game.PokerEnv'))
@@ -0,0 +1,260 @@
+from bisect import bisect_right
+from itertools import product
+from math import comb
+from Deck import card
+
+# Suit isomorphic hand indexing after Waugh, "A Fast and Optimal Hand
+# Isomorphism Algorithm" (2013). Hands that only differ by a permutation of
+# suits get the same index and the indices of a street are dense, so tables
+# keyed by (hand, table) can be plain arrays:
+#   PREFLOP 169, FLOP 1,286,792, TURN 13,960,050, RIVER 123,156,254
+#
+# Each suit of a hand is described by its configuration, the number of
+# cards it has in every round (hole cards, board), and by the
+# index of its rank sets: round by round, the colex index of the round's
+# ranks among the ranks that suit has not used yet. Suits are then sorted,
+# so any permutation of suits gives the same sorted list; suits with the
+# same configuration form a multiset of their indices.
+
+RANKS = 13
+SUITS = 4
+
+STREETS = ['PREFLOP', 'FLOP', 'TURN', 'RIVER']
+# The board is one round whatever the street: what a hand is worth does not
+# depend on which board card came first, and splitting the turn and river
+# off the flop would make those streets four and twenty times bigger
+ROUNDS = {'PREFLOP' : (2,), 'FLOP' : (2, 3), 'TURN' : (2, 4), 'RIVER' : (2, 5)}
+STREET_BY_TABLE = {0 : 'PREFLOP', 3 : 'FLOP', 4 : 'TURN', 5 : 'RIVER'}
+
+POPCOUNT = [bin(m).count('1') for m in range(1 << RANKS)]
+
+# Colex index of every rank set and, per set size, the sets in index order
+SET_INDEX = [0] * (1 << RANKS)
+SETS = [[] for _ in range(RANKS + 1)]
+for _mask in range(1 << RANKS):
+    _ranks = [r for r in range(RANKS) if _mask >> r & 1]
+    SET_INDEX[_mask] = sum(comb(r, i + 1) for i, r in enumerate(_ranks))
+for _mask in range(1 << RANKS):
+    SETS[POPCOUNT[_mask]].append(_mask)
+for _k in range(RANKS + 1):
+    SETS[_k].sort(key=SET_INDEX.__getitem__)
+
+
+def _compress(mask, used):
+    # Positions of the ranks of mask among the ranks not in used
+    out = 0
+    while mask:
+        low = mask & -mask
+        out |= low >> POPCOUNT[used & (low - 1)]
+        mask ^= low
+    return out
+
+
+def _expand(mask, used):
+    # Inverse of _compress: the n-th free rank for every bit n of mask
+    out = 0
+    free = ((1 << RANKS) - 1) & ~used
+    n = 0
+    while free:
+        low = free & -free
+        if mask >> n & 1:
+            out |= low
+        free ^= low
+        n += 1
+    return out
+
+
+def _multiset_index(values):
+    # values sorted in decreasing order; rank among the multisets of that
+    # size, via the k-subset {v_i + k - i} in the combinatorial number system
+    k = len(values)
+    return sum(comb(v + k - 1 - i, k - i) for i, v in enumerate(values))
+
+
+def _multiset_values(index, k, n):
+    values = []
+    for i in range(k):
+        j = k - i
+        # Largest w with comb(w, j) <= index, w < n + j - 1
+        lo, hi = j - 1, n + j - 2
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if comb(mid, j) <= index:
+                lo = mid
+            else:
+                hi = mid - 1
+        index -= comb(lo, j)
+        values.append(lo - (j - 1))
+    return values
+
+
+def _code(c):
+    return c if isinstance(c, int) else c.code
+
+
+class HandIndexer:
+
+    def __init__(self, rounds):
+
+        # rounds is the number of cards in each round, e.g. (2, 3) for the
+        # hole cards and the flop
+        self.rounds = tuple(rounds)
+
+        # Every way to split each round's cards over the four suits, sorted
+        # so that suit permutations collapse, becomes a configuration with
+        # its own block of indices
+        splits = [[s for s in product(range(n + 1), repeat=SUITS) if sum(s) == n] for n in self.rounds]
+        configurations = set()
+        for split in product(*splits):
+            suits = tuple(sorted(zip(*split), reverse=True))
+            if all(sum(suit) <= RANKS for suit in suits):
+                configurations.add(suits)
+
+        self.configurations = sorted(configurations, reverse=True)
+        self.config_id = {config: i for i, config in enumerate(self.configurations)}
+        self.groups = []
+        self.offsets = []
+        size = 0
+        for config in self.configurations:
+            # Runs of equal suit configurations: (configuration, suits in it,
+            # indices per suit, multisets of the run)
+            groups = []
+            for suit in config:
+                if groups and groups[-1][0] == suit:
+                    groups[-1][1] += 1
+                else:
+                    groups.append([suit, 1, self.suit_size(suit)])
+            groups = [(suit, k, n, comb(n + k - 1, k)) for suit, k, n in groups]
+            self.groups.append(groups)
+            self.offsets.append(size)
+            size += self._config_size(groups)
+        self.size = size
+
+    @staticmethod
+    def suit_size(suit):
+        used = 0
+        n = 1
+        for c in suit:
+            n *= comb(RANKS - used, c)
+            used += c
+        return n
+
+    @staticmethod
+    def _config_size(groups):
+        n = 1
+        for _, _, _, multisets in groups:
+            n *= multisets
+        return n
+
+    def index(self, cards):
+
+        # cards in dealing order: the hole cards, then the board, as Cards
+        # or codes
+        masks = [[0] * len(self.rounds) for _ in range(SUITS)]
+        i = 0
+        for r, n in enumerate(self.rounds):
+            for c in cards[i:i + n]:
+                c = _code(c)
+                masks[c & 3][r] |= 1 << (c >> 2)
+            i += n
+
+        suits = []
+        for rounds in masks:
+            used = 0
+            index = 0
+            for mask in rounds:
+                count = POPCOUNT[mask]
+                index = index * comb(RANKS - POPCOUNT[used], count) + SET_INDEX[_compress(mask, used)]
+                used |= mask
+            suits.append((tuple(POPCOUNT[m] for m in rounds), index))
+        suits.sort(reverse=True)
+
+        c = self.config_id[tuple(suit for suit, _ in suits)]
+        index = 0
+        i = 0
+        for _, k, _, multisets in self.groups[c]:
+            index = index * multisets + _multiset_index([v for _, v in suits[i:i + k]])
+            i += k
+        return self.offsets[c] + index
+
+    def unindex(self, index):
+
+        # The canonical hand of an index as card codes in dealing order;
+        # suits are handed out in the sorted order, so the first suit in
+        # that order is hearts
+        if not 0 <= index < self.size:
+            raise IndexError(f'Hand index {index} out of range for {self.size} hands.')
+        c = bisect_right(self.offsets, index) - 1
+        index -= self.offsets[c]
+
+        values = []
+        for _, k, n, multisets in reversed(self.groups[c]):
+            index, rest = divmod(index, multisets)
+            values = _multiset_values(rest, k, n) + values
+
+        rounds = [[] for _ in self.rounds]
+        for suit, (config, value) in enumerate(zip(self.configurations[c], values)):
+            sizes = []
+            used = 0
+            for count in config:
+                sizes.append(comb(RANKS - used, count))
+                used += count
+            parts = []
+            for size in reversed(sizes):
+                value, part = divmod(value, size)
+                parts.append(part)
+            used = 0
+            for r, (count, part) in enumerate(zip(config, reversed(parts))):
+                mask = _expand(SETS[count][part], used)
+                used |= mask
+                for rank in range(RANKS):
+                    if mask >> rank & 1:
+                        rounds[r].append(rank * 4 + suit)
+
+        return [code for codes in rounds for code in sorted(codes)]
+
+
+INDEXERS = {}
+
+
+def indexer(street):
+    if street not in INDEXERS:
+        INDEXERS[street] = HandIndexer(ROUNDS[street])
+    return INDEXERS[street]
+
+
+def hand_index(hand, table):
+    # Canonical index of a player's hand on the current table; the street
+    # follows from the number of table cards
+    return indexer(STREET_BY_TABLE[len(table)]).index(list(hand) + list(table))
+
+
+def hand_from_index(street, index):
+    codes = indexer(street).unindex(index)
+    return [card(c) for c in codes[:2]], [card(c) for c in codes[2:]]
+
+
+if __name__ == '__main__':
+    import random
+    import time
+    from Deck import Deck
+
+    for street in STREETS:
+        print(street, indexer(street).size)
+
+    deck = Deck(random.Random(0))
+    deck.shuffle()
+    hand, table = deck.draw(2), deck.draw(5)
+    for n in (0, 3, 4, 5):
+        i = hand_index(hand, table[:n])
+        print(hand, table[:n], i, hand_from_index(STREET_BY_TABLE[n], i))
+
+    rivers = indexer('RIVER')
+    hands = []
+    for _ in range(10000):
+        deck.shuffle()
+        hands.append(deck.drawCodes(7))
+    start = time.perf_counter()
+    for codes in hands:
+        rivers.index(codes)
+    print('river index', round((time.perf_counter() - start) / len(hands) * 1e6, 1), 'us')
@@ -2,12 +2,14 @@ import torch as T
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
-import numpy as num_players
+import numpy as np
+from observation import obs_dim
+from replay import ReplayBuffer, PrioritizedReplayBuffer
 
 class DeepQNetwork(nn.Module):
     def __init__(self, ALPHA, numPlayers = 6):
         super(DeepQNetwork, self).__init__()
-        self.fc1 = nn.Linear(num_players * 3 + 52*2 + 1 + 3, 256)
+        self.fc1 = nn.Linear(obs_dim(numPlayers), 256)
         self.fc2 = nn.Linear(256, 128)
         self.fc3 = nn.Linear(128, 4)
 
@@ -17,7 +19,9 @@ class DeepQNetwork(nn.Module):
         self.to(self.device)
 
     def forward(self, observation):
-        observation = T.Tensor(observation).to(self.device)
+        if not isinstance(observation, T.Tensor):
+            observation = T.from_numpy(np.asarray(observation, dtype=np.float32))
+        observation = observation.to(self.device)
         observation = F.relu(self.fc1(observation))
         observation = F.relu(self.fc2(observation))
         actions = F.relu(self.fc3(observation))
@@ -27,7 +31,7 @@ class DeepQNetwork(nn.Module):
 class Agent(object):
     def __init__(self, gamma, epsilon, alpha,
                  maxMemorySize, epsEnd=0.05,
-                 replace=10000, actionSpace=[0,1,2,3]):
+                 replace=10000, actionSpace=[0,1,2,3], numPlayers=6, prioritized=False):
                  
         self.GAMMA = gamma
         self.EPSILON = epsilon
@@ -37,24 +41,26 @@ class Agent(object):
         self.memSize = maxMemorySize
         self.steps = 0
         self.learn_step_counter = 0
-        self.memory = []
+        self.prioritized = prioritized
+        if prioritized:
+            self.memory = PrioritizedReplayBuffer(maxMemorySize, obs_dim(numPlayers))
+        else:
+            self.memory = ReplayBuffer(maxMemorySize, obs_dim(numPlayers))
         self.memCntr = 0
         self.replace_target_cnt = replace
-        self.Q_eval = DeepQNetwork(alpha)
-        self.Q_next = DeepQNetwork(alpha)
+        self.Q_eval = DeepQNetwork(alpha, numPlayers)
+        self.Q_next = DeepQNetwork(alpha, numPlayers)
 
-    def storeTransition(self, state, action, reward, state_):
-        if self.memCntr < self.memSize:
-            self.memory.append([state, action, reward, state_])
-        else:
-            self.memory[self.memCntr%self.memSize] = [state, action, reward, state_]
+    def storeTransition(self, state, action, reward, state_, done=False):
+        self.memory.store(state, action, reward, state_, done)
         self.memCntr += 1
 
     def chooseAction(self, observation):
         rand = np.random.random()
-        actions = self.Q_eval.forward(observation)
         if rand < 1 - self.EPSILON:
-            action = T.argmax(actions[1]).item()
+            with T.inference_mode():
+                actions = self.Q_eval.forward(observation)
+            action = T.argmax(actions).item()
         else:
             action = np.random.choice(self.actionSpace)
         self.steps += 1
@@ -66,22 +72,21 @@ class Agent(object):
            self.learn_step_counter % self.replace_target_cnt == 0:
             self.Q_next.load_state_dict(self.Q_eval.state_dict())
 
-        if self.memCntr+batch_size < self.memSize:
-            memStart = int(np.random.choice(range(self.memCntr)))
+        if self.prioritized:
+            states, actions, rewards, states_, dones, idx, weights = self.memory.sample(batch_size)
         else:
-            memStart = int(np.random.choice(range(self.memSize-batch_size-1)))
-        miniBatch=self.memory[memStart:memStart+batch_size]
-        memory = np.array(miniBatch)
+            states, actions, rewards, states_, dones = self.memory.sample(batch_size)
+        device = self.Q_eval.device
 
-        # convert to list because memory is an array of numpy objects
-        Qpred = self.Q_eval.forward(list(memory[:,0][:])).to(self.Q_eval.device)
-        Qnext = self.Q_next.forward(list(memory[:,3][:])).to(self.Q_eval.device)
+        Qpred = self.Q_eval.forward(T.from_numpy(states))
+        Qnext = self.Q_next.forward(T.from_numpy(states_))
 
-        maxA = T.argmax(Qnext, dim=1).to(self.Q_eval.device)
-        rewards = T.Tensor(list(memory[:,2])).to(self.Q_eval.device)
-        Qtarget = Qpred.clone()
-        indices = np.arange(batch_size)
-        Qtarget[indices,maxA] = rewards + self.GAMMA*T.max(Qnext[1])
+        actions = T.from_numpy(actions).to(device)
+        rewards = T.from_numpy(rewards).to(device)
+        dones = T.from_numpy(dones).to(device)
+        Qtarget = Qpred.clone().detach()
+        indices = T.arange(batch_size, device=device)
+        Qtarget[indices, actions] = rewards + self.GAMMA * T.max(Qnext, dim=1)[0].detach() * (1 - dones)
 
         if self.steps > 500:
             if self.EPSILON - 1e-4 > self.EPS_END:
@@ -90,7 +95,15 @@ class Agent(object):
                 self.EPSILON = self.EPS_END
 
         #Qpred.requires_grad_()
-        loss = self.Q_eval.loss(Qtarget, Qpred).to(self.Q_eval.device)
+        if self.prioritized:
+            # Importance-sampling weighted squared error; the new priorities are
+            # the TD errors of the actions taken
+            td_errors = (Qtarget - Qpred)[indices, actions]
+            weights = T.from_numpy(weights).to(device)
+            loss = (weights[:, None] * (Qtarget - Qpred) ** 2).mean()
+            self.memory.update_priorities(idx, td_errors.detach().cpu().numpy())
+        else:
+            loss = self.Q_eval.loss(Qtarget, Qpred).to(self.Q_eval.device)
         loss.backward()
         self.Q_eval.optimizer.step()
         self.learn_step_counter += 1
@@ -0,0 +1,141 @@
+import numpy as np
+
+
+def obs_dim(num_players):
+    # stacks, on_pots and folded per seat starting from the player's own,
+    # hole and board one-hot, pot, current bet, big blind and the player's
+    # own bet on the table
+    return num_players * 3 + 52 * 2 + 1 + 3
+
+
+ACTIONS = ['CHECK', 'BET', 'CALL', 'FOLD']
+
+
+def decode_action(index, gameState, stack):
+
+    # Turns a network output index (in PokerEnv.possibleActions order) into a
+    # legal action dict for a player with this stack
+    choice = ACTIONS[index]
+    curr_bet = gameState['curr_bet']
+    on_table = gameState.get('on_table', 0)
+
+    if choice == 'BET' and curr_bet >= stack + on_table:
+        choice = 'CALL'
+    if choice == 'CHECK' and on_table < curr_bet:
+        choice = 'FOLD'
+    if choice == 'CALL' and on_table == curr_bet:
+        choice = 'CHECK'
+
+    if choice == 'BET':
+        amount = max(gameState['big_blind'], curr_bet * 2)
+    elif choice == 'CALL':
+        amount = curr_bet - on_table
+    else:
+        amount = 0
+
+    return {
+        'type'  : choice,
+        'amount' : amount
+    }
+
+
+class ObservationEncoder:
+
+    def __init__(self, num_players, total_chips):
+
+        # Chip amounts are divided by the chips in play, num_players * stack
+        # for a fresh tournament
+        self.num_players = num_players
+        self.total_chips = total_chips
+        self.scale = 1.0 / total_chips
+        self.obs_dim = obs_dim(num_players)
+
+        P = num_players
+        self.HAND = 0
+        self.TABLE = 52
+        self.STACKS = 104
+        self.ON_POTS = self.STACKS + P
+        self.FOLDED = self.ON_POTS + P
+        self.POT = self.FOLDED + P
+        self.CURR_BET = self.POT + 1
+        self.BIG_BLIND = self.POT + 2
+        self.ON_TABLE = self.POT + 3
+
+        self.buffer = np.zeros(self.obs_dim, dtype=np.float32)
+        self._rows = np.zeros((0, 1), dtype=np.int64)
+        self._board = np.zeros((0, 53), dtype=np.float32)
+
+    def encode(self, gameState, out=None):
+
+        # gameState as returned by PokerEnv._get_game_state. Seats are
+        # turned so the player's own seat comes first and the others follow
+        # in table order; seats that are out of the tournament are left at
+        # zero, so nobody changes place when someone busts.
+        out = self.buffer if out is None else out
+        out.fill(0)
+        scale = self.scale
+        seat = gameState.get('seat', 0)
+        P = self.num_players
+
+        for c in gameState['hand']:
+            out[c.code] = 1
+        for c in gameState['table']:
+            out[self.TABLE + c.code] = 1
+
+        for i, s in enumerate(gameState['stacks']):
+            out[self.STACKS + (i - seat) % P] = s * scale
+        for i, s in enumerate(gameState['on_pots']):
+            out[self.ON_POTS + (i - seat) % P] = s * scale
+        for i, f in enumerate(gameState['folded']):
+            out[self.FOLDED + (i - seat) % P] = f
+
+        out[self.POT] = gameState['pot'] * scale
+        out[self.CURR_BET] = gameState['curr_bet'] * scale
+        out[self.BIG_BLIND] = gameState['big_blind'] * scale
+        out[self.ON_TABLE] = gameState.get('on_table', 0) * scale
+
+        return out
+
+    def encode_batch(self, out, hand, table, pot, curr_bet, big_blind, stacks, on_pots, folded, on_table, seat=0):
+
+        # Fills out, an (N, obs_dim) float32 array, in place. hand is (N, 2),
+        # table (N, 5) with -1 for cards not dealt yet, the rest per table or
+        # (N, num_players). seat is the acting player's seat on every table;
+        # seats are turned as in encode. Scratch buffers are reused between
+        # calls.
+        n = out.shape[0]
+        if self._rows.shape[0] != n:
+            self._rows = np.arange(n)[:, None]
+            self._board = np.zeros((n, 53), dtype=np.float32)
+
+        out.fill(0)
+        out[self._rows, hand] = 1
+
+        # -1 lands in the spare 53rd column
+        self._board.fill(0)
+        self._board[self._rows, table] = 1
+        out[:, self.TABLE:self.STACKS] = self._board[:, :52]
+
+        P = self.num_players
+        if seat:
+            stacks, on_pots, folded = (np.roll(a, -seat, axis=1) for a in (stacks, on_pots, folded))
+        np.multiply(stacks, self.scale, out=out[:, self.STACKS:self.STACKS + P], casting='unsafe')
+        np.multiply(on_pots, self.scale, out=out[:, self.ON_POTS:self.ON_POTS + P], casting='unsafe')
+        out[:, self.FOLDED:self.FOLDED + P] = folded
+        np.multiply(pot, self.scale, out=out[:, self.POT], casting='unsafe')
+        np.multiply(curr_bet, self.scale, out=out[:, self.CURR_BET], casting='unsafe')
+        out[:, self.BIG_BLIND] = big_blind * self.scale
+        np.multiply(on_table, self.scale, out=out[:, self.ON_TABLE], casting='unsafe')
+
+        return out
+
+
+if __name__ == '__main__':
+    from Player import AgressivePlayer, SoftRandomPlayer, TightPlayer
+    from PokerEnv import PokerEnv
+
+    env = PokerEnv([AgressivePlayer('Agressif'), SoftRandomPlayer('RandomBoy'), TightPlayer('Jonny Apertadinho')], 100, 2)
+    encoder = ObservationEncoder(4, 400)
+    obs = env.reset()
+    print(obs)
+    print(encoder.encode(obs))
@@ -0,0 +1,174 @@
+import numpy as np
+
+
+class ReplayBuffer:
+
+    def __init__(self, capacity, state_dim, seed=None):
+
+        # Fixed-size ring buffer of typed arrays; the oldest transitions are
+        # overwritten once it is full
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def store(self, state, action, reward, next_state, done=False):
+
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return i
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+
+        # One row per table of a vectorized environment
+        idx = (self.position + np.arange(len(actions))) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+
+        self.position = (self.position + len(actions)) % self.capacity
+        self.size = min(self.size + len(actions), self.capacity)
+        return idx
+
+    def sample_indices(self, batch_size):
+        return self.rng.integers(0, self.size, batch_size)
+
+    def sample(self, batch_size):
+
+        # Fancy indexing returns fresh contiguous arrays, ready for
+        # torch.from_numpy without another copy
+        idx = self.sample_indices(batch_size)
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx]
+
+
+class SumTree:
+
+    def __init__(self, capacity):
+
+        # Complete binary tree in one array: node i has children 2i and 2i+1,
+        # the leaves start at self.leaves and the root (index 1) holds the total
+        self.capacity = capacity
+        self.leaves = 1
+        while self.leaves < capacity:
+            self.leaves *= 2
+        self.depth = self.leaves.bit_length() - 1
+        self.tree = np.zeros(2 * self.leaves, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+
+        # Writes the leaves then recomputes each touched parent from its
+        # children, level by level, so repeated indices are harmless
+        nodes = np.asarray(indices) + self.leaves
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+
+        # Index of the leaf where each prefix sum value falls, all values
+        # descending the tree together
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values > self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.leaves, self.capacity - 1)
+
+
+class PrioritizedReplayBuffer(ReplayBuffer):
+
+    def __init__(self, capacity, state_dim, alpha=0.6, beta=0.4, beta_increment=1e-5, epsilon=1e-6, seed=None):
+        super().__init__(capacity, state_dim, seed)
+        self.tree = SumTree(capacity)
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon
+        self.max_priority = 1.0
+
+    def store(self, state, action, reward, next_state, done=False):
+
+        # New transitions get the highest priority seen so far
+        i = super().store(state, action, reward, next_state, done)
+        self.tree.update([i], self.max_priority ** self.alpha)
+        return i
+
+    def store_batch(self, states, actions, rewards, next_states, dones):
+        idx = super().store_batch(states, actions, rewards, next_states, dones)
+        self.tree.update(idx, self.max_priority ** self.alpha)
+        return idx
+
+    def sample_indices(self, batch_size):
+
+        # One value per equal slice of the total priority mass
+        segment = self.tree.total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        return np.minimum(self.tree.find(values), self.size - 1)
+
+    def sample(self, batch_size):
+
+        idx = self.sample_indices(batch_size)
+
+        # Importance-sampling weights, normalized by the largest in the batch
+        probabilities = self.tree.tree[idx + self.tree.leaves] / self.tree.total
+        weights = np.power(self.size * probabilities, -self.beta)
+        weights = (weights / weights.max()).astype(np.float32)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return self.states[idx], self.actions[idx], self.rewards[idx], self.next_states[idx], self.dones[idx], idx, weights
+
+    def update_priorities(self, idx, td_errors):
+        priorities = np.abs(td_errors) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(idx, priorities ** self.alpha)
+
+
+if __name__ == '__main__':
+    import time
+
+    capacity = 1 << 20
+    batch_size = 256
+    memory = PrioritizedReplayBuffer(capacity, 8, seed=0)
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    for _ in range(capacity // 4096):
+        memory.store_batch(rng.random((4096, 8)), rng.integers(0, 4, 4096), rng.random(4096), rng.random((4096, 8)), np.zeros(4096))
+    print('fill', capacity, 'transitions', round(time.perf_counter() - start, 2), 's')
+
+    rounds = 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        batch = memory.sample(batch_size)
+    elapsed = time.perf_counter() - start
+    print('sample', int(rounds * batch_size / elapsed), 'transitions/s')
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        memory.update_priorities(batch[5], rng.random(batch_size))
+    elapsed = time.perf_counter() - start
+    print('update', int(rounds * batch_size / elapsed), 'priorities/s')
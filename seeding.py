@@ -0,0 +1,46 @@
+import random
+import numpy as np
+
+
+def spawn(seed, n):
+    # n independent child seed sequences of a master seed, which can be an
+    # int or a list of ints such as [master, shard]
+    return np.random.SeedSequence(seed).spawn(n)
+
+
+def player_rng(seq):
+    # Bots use choice/randint/random, so they get a random.Random of their own
+    return random.Random(int(seq.generate_state(1, np.uint64)[0]))
+
+
+def table_rngs(seed, num_players):
+
+    # One numpy Generator for the deck and one random.Random per seat, each
+    # from its own stream so seats never share state
+    deck_seq, *player_seqs = spawn(seed, num_players + 1)
+    return np.random.default_rng(deck_seq), [player_rng(s) for s in player_seqs]
+
+
+def seed_table(seed, players):
+
+    # Gives every player without an rng of its own its stream of the table
+    # seed and returns the generator for the table's deck. Streams from an
+    # earlier seeded table are replaced too, so the same seed on the same
+    # players always plays out the same way.
+    deck_rng, rngs = table_rngs(seed, len(players))
+    for p, rng in zip(players, rngs):
+        if p.rng is random or p.table_rng:
+            p.rng = rng
+            p.table_rng = True
+    return deck_rng
+
+
+def table_seeds(seed, tables):
+    # Per-table seeds for parallel workers
+    return [[int(s) for s in seq.generate_state(2)] for seq in spawn(seed, tables)]
+
+
+if __name__ == '__main__':
+    deck, players = table_rngs(42, 3)
+    print(deck.integers(0, 52, 5), [p.randint(0, 100) for p in players])
+    print(table_seeds(42, 4))
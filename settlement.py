@@ -0,0 +1,105 @@
+import numpy as np
+
+
+def settle_pots(contributions, folded, ranks=None):
+
+    # contributions, folded and ranks are per seat. Pots are cut at the
+    # contribution level of every player still in the hand; chips above the
+    # highest of those were never matched and go back to whoever put them in.
+    # ranks only needs entries for live seats, and only if a pot is contested.
+    # Odd chips go to the winners in seat order.
+    n = len(contributions)
+    order = sorted(range(n), key=contributions.__getitem__)
+
+    payouts = [0] * n
+    refunds = [0] * n
+    pots = []
+    amount = 0
+    previous = 0
+
+    for i, seat in enumerate(order):
+        level = contributions[seat]
+        amount += (level - previous) * (n - i)
+        previous = level
+        if folded[seat] or not amount:
+            continue
+
+        eligible = sorted(t for t in order[i:] if not folded[t])
+        if len(eligible) == 1:
+            winners = eligible
+        else:
+            if ranks is None:
+                raise Exception('Hand ranks are needed to settle a contested pot.')
+            best = max(ranks[t] for t in eligible)
+            winners = [t for t in eligible if ranks[t] == best]
+
+        portion, extra = divmod(amount, len(winners))
+        shares = [portion + (k < extra) for k in range(len(winners))]
+        for t, share in zip(winners, shares):
+            payouts[t] += share
+
+        pots.append({
+            'amount' : amount,
+            'level' : level,
+            'eligible' : eligible,
+            'winners' : winners,
+            'shares' : shares
+        })
+        amount = 0
+
+    top = pots[-1]['level'] if pots else 0
+    for seat in range(n):
+        if contributions[seat] > top:
+            refunds[seat] = contributions[seat] - top
+            payouts[seat] += refunds[seat]
+
+    return {
+        'payouts' : payouts,
+        'refunds' : refunds,
+        'pots' : pots
+    }
+
+
+def settle_batch(contributions, folded, ranks):
+
+    # Same rules as settle_pots for N tables at once: (N, P) arrays in, the
+    # (N, P) chips each seat gets back out. Ranks of folded seats are ignored.
+    contributions = np.asarray(contributions, dtype=np.int64)
+    folded = np.asarray(folded, dtype=bool)
+    ranks = np.where(folded, -1, ranks)
+
+    levels = np.sort(np.where(folded, 0, contributions), axis=1)
+    payouts = np.zeros_like(contributions)
+    below = np.zeros_like(contributions)
+
+    for j in range(contributions.shape[1]):
+        level = levels[:, j]
+        capped = np.minimum(contributions, level[:, None])
+        amount = (capped - below).sum(axis=1)
+        below = capped
+
+        eligible = ~folded & (contributions >= level[:, None])
+        best = np.where(eligible, ranks, -1).max(axis=1)
+        winners = eligible & (ranks == best[:, None])
+
+        n_winners = np.maximum(winners.sum(axis=1), 1)
+        portion = amount // n_winners
+        extra = amount % n_winners
+        payouts += winners * portion[:, None] + (winners & (np.cumsum(winners, axis=1) <= extra[:, None]))
+
+    return payouts + contributions - below
+
+
+if __name__ == '__main__':
+    # Seat 0 all in for 20, seat 1 all in for 50, seat 2 folded after putting
+    # in 70, seat 3 bet 120 and seat 4 called 80 all in
+    contributions = [20, 50, 70, 120, 80]
+    folded = [False, False, True, False, False]
+    ranks = [5, 4, 9, 1, 3]
+
+    result = settle_pots(contributions, folded, ranks)
+    for pot in result['pots']:
+        print(pot)
+    print('refunds', result['refunds'])
+    print('payouts', result['payouts'])
+    print('batch  ', settle_batch([contributions], [folded], [ranks])[0].tolist())
@@ -0,0 +1,62 @@
+import time
+from collections import Counter
+from Game import PokerEnv
+
+
+def simulate(players, stack, small_blind, games, seed=None, recorder=None, profiler=None):
+
+    # Runs full tournaments without any console output and returns aggregate
+    # results per seat (in the order of players) and per player class
+    env = PokerEnv(players, stack, small_blind, seed=seed, recorder=recorder, profiler=profiler)
+    seats = len(players)
+
+    wins = Counter()
+    seat_wins = [0] * seats
+    hands_played = [0] * seats
+    chip_delta = [0] * seats
+    hands = 0
+
+    for _ in range(games):
+
+        env.reset_env()
+
+        while(len(env.players) > 1):
+            before = [p.stack for p in players]
+            env.play_hand()
+            hands += 1
+
+            for i, p in enumerate(players):
+                if before[i]:
+                    hands_played[i] += 1
+                    chip_delta[i] += p.stack - before[i]
+
+        winner = env.players[0]
+        wins[winner.__class__.__name__] += 1
+        seat_wins[players.index(winner)] += 1
+
+    return {
+        'games' : games,
+        'hands' : hands,
+        'wins' : dict(wins),
+        'seat_wins' : seat_wins,
+        'hands_played' : hands_played,
+        'chip_delta' : chip_delta,
+    }
+
+
+def chip_ev(result):
+    return [d / n if n else 0.0 for d, n in zip(result['chip_delta'], result['hands_played'])]
+
+
+if __name__ == '__main__':
+    from Player import RandomPlayer, SoftRandomPlayer, TightPlayer, AgressivePlayer
+
+    players = [ RandomPlayer('Fabio'), AgressivePlayer('Agressif'), SoftRandomPlayer('RandomBoy'), TightPlayer('Jonny Apertadinho')]
+
+    start = time.perf_counter()
+    result = simulate(players, 100, 2, 1000, seed=0)
+    elapsed = time.perf_counter() - start
+
+    print(result)
+    print('chip EV per hand', chip_ev(result))
+    print('hands/s', int(result['hands'] / elapsed))
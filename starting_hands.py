@@ -1,9 +1,61 @@
 hands = ['32o', '52o', '53o', '62o', '42o', '73o', '52s', '72o', '63o', '43o', '64o', '32s', '54o', '72s', '42s', '82o', '85o', '74o', '92o', '74s', '83o', '65o', 'T3o', 'T2o', '53s', '75o', '75s', '64s', '93s', '95s', '63s', 'T3s', '62s', '93o', '94o', 'T2s', '95o', 'J2s', '76o', '22o', '84o', 'J4o', '86s', 'Q2o', '82s', '83s', 'T5o', 'J2o', '92s', '65s', '87o', '94s', '43s', 'T6o', '85s', '96o', '54s', '73s', 'T6s', 'Q3o', '86o', 'J3o', '96s', 'Q2s', '76s', 'T7s', '87s', 'J3s', '97o', 'T4o', 'J8o', 'J6o', 'J5o', '98o', '84s', 'J7o', 'K2s', 'T4s', 'K2o', 'Q5o', 'T7o', 'T8o', 'T5s', 'J4s', '33o', 'Q6o', 'J5s', 'T9s', 'Q4s', 'K3o', 'Q3s', 'K4o', 'J8s', 'J9s', 'K5o', 'K6s', 'K4s', 'Q5s', 'Q4o', 'A5o', 'T9o', '97s', 'Q7o', 'A3o', 'T8s', 'A6s', 'Q7s', 'J6s', 'K8o', 'A2o', 'K7o', 'Q9o', 'J9o', '55o', 'K6o', 'QJo', '98s', 'K3s', 'A4s', 'JTo', 'K8s', 'A2s', 'A5s', 'KJs', 'J7s', '44o', 'A4o', 'Q8o', 'Q9s', 'QTo', 'A8o', 'Q8s', 'K9o', 'A6o', 'A9o', 'K9s', 'A9s', 'K7s', 'A7o', 'KTo', 'KJo', 'Q6s', 'A3s', 'JTs', 'AJo', 'QTs', 'ATo', 'AQs', 'A7s', 'K5s', 'KQs', 'KTs', 'KQo', 'AQo', '88o', 'ATs', '77o', '66o', 'A8s', 'AJs', 'QJs', 'AKo', 'AKs', '99o', 'TTo', 'JJo', 'QQo', 'KKo', 'AAo', ]
 
-def rank_hand(hand):
-    return (hands.index(hand) + 1) / 169
-    
+import os
+import numpy as np
+from Deck import num_to_repr
+
+EQUITY_TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.npy')
+MIN_PLAYERS = 2
+MAX_PLAYERS = 9
+
+hand_index = {h: i for i, h in enumerate(hands)}
+
+
+def class_name(c1, c2):
+    r1, r2 = (c1 >> 2) + 2, (c2 >> 2) + 2
+    if r1 < r2:
+        r1, r2 = r2, r1
+    is_suited = (c1 & 3) == (c2 & 3)
+    return f"{num_to_repr.get(r1, r1)}{num_to_repr.get(r2, r2)}{'s' if is_suited else 'o'}"
+
+
+# Class index for every ordered pair of hole card codes, c1 * 52 + c2
+hole_class = [hand_index[class_name(c1, c2)] if c1 != c2 else -1 for c1 in range(52) for c2 in range(52)]
+
+_equity_table = None
+_percentiles = {}
+
+
+def equity_table():
+
+    # (169, MAX_PLAYERS - 1) float32 array of all-in equities, rows follow
+    # the order of hands and column k is for k + 2 players
+    global _equity_table
+    if _equity_table is None:
+        _equity_table = np.load(EQUITY_TABLE_PATH, mmap_mode='r')
+    return _equity_table
+
+
+def preflop_equity(c1, c2, players=2):
+    return float(equity_table()[hole_class[c1 * 52 + c2], players - MIN_PLAYERS])
+
+
+def rank_hand(hand, players=None):
+
+    if players is None:
+        return (hand_index[hand] + 1) / 169
+
+    # Percentile of the hand among the 169 classes by equity at this table size
+    if players not in _percentiles:
+        column = equity_table()[:, players - MIN_PLAYERS]
+        order = np.argsort(column, kind='stable')
+        percentiles = np.empty(169)
+        percentiles[order] = np.arange(1, 170) / 169
+        _percentiles[players] = percentiles
+    return float(_percentiles[players][hand_index[hand]])
+
 if __name__ == "__main__":
 
     print('Lenght: ', len(hands))
-    print(hands.index('T9s') / len(hands))
\ No newline at end of file
+    print(hands.index('T9s') / len(hands))
+    print('AKs equity vs 1..8 opponents', [round(float(e), 3) for e in equity_table()[hand_index['AKs']]])
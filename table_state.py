@@ -0,0 +1,62 @@
+class TableState:
+
+    # Counters behind the betting_round predicates. Players still hold their
+    # own stack/on_table/folded/has_played; the environment takes a player out
+    # with remove() before applying its action and puts it back with add(),
+    # so each action costs O(1) whatever the number of seats.
+    #   in_hand  players not folded
+    #   active   not folded and not all in
+    #   matched  active players whose on_table equals the highest bet
+    #   pending  active players that have not acted yet this round
+
+    __slots__ = ('total_stack', 'in_hand', 'active', 'matched', 'pending', 'highest_bet')
+
+    def __init__(self):
+        self.reset([], 0)
+
+    def reset(self, players, highest_bet):
+        self.total_stack = 0
+        self.in_hand = 0
+        self.active = 0
+        self.matched = 0
+        self.pending = 0
+        self.highest_bet = highest_bet
+        for p in players:
+            self.add(p)
+
+    def add(self, p):
+        self.total_stack += p.stack
+        if not p.folded:
+            self.in_hand += 1
+            if p.stack > 0:
+                self.active += 1
+                self.matched += p.on_table == self.highest_bet
+                self.pending += not p.has_played
+
+    def remove(self, p):
+        self.total_stack -= p.stack
+        if not p.folded:
+            self.in_hand -= 1
+            if p.stack > 0:
+                self.active -= 1
+                self.matched -= p.on_table == self.highest_bet
+                self.pending -= not p.has_played
+
+    def raise_to(self, highest_bet):
+        # Only the raiser, who is out of the counters at this point, can have
+        # put in this much
+        if highest_bet != self.highest_bet:
+            self.highest_bet = highest_bet
+            self.matched = 0
+
+    def others_can_call(self, p):
+        return self.total_stack - p.stack > 0
+
+    def everyone_has_played(self):
+        return self.pending == 0
+
+    def bet_still_to_resolve(self):
+        return self.active > 0 and self.matched < self.active
+
+    def more_than_one_player_left(self):
+        return self.in_hand > 1
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from simulation import simulate
+
+
+class TournamentResult:
+
+    def __init__(self, lineup):
+        self.lineup = [cls.__name__ for cls in lineup]
+        self.games = 0
+        self.hands = 0
+        self.seat_wins = [0] * len(lineup)
+        self.hands_played = [0] * len(lineup)
+        self.chip_delta = [0] * len(lineup)
+
+    def merge(self, result):
+        self.games += result['games']
+        self.hands += result['hands']
+        for i in range(len(self.lineup)):
+            self.seat_wins[i] += result['seat_wins'][i]
+            self.hands_played[i] += result['hands_played'][i]
+            self.chip_delta[i] += result['chip_delta'][i]
+        return self
+
+    @property
+    def win_rates(self):
+        return [w / self.games if self.games else 0.0 for w in self.seat_wins]
+
+    @property
+    def chip_ev(self):
+        # Average net chips won per hand dealt to the seat
+        return [d / n if n else 0.0 for d, n in zip(self.chip_delta, self.hands_played)]
+
+    def __repr__(self):
+        seats = '\n'.join(
+            f'  {i} {name:<18} win rate {w:.3f}  chip EV/hand {ev:+.3f}'
+            for i, (name, w, ev) in enumerate(zip(self.lineup, self.win_rates, self.chip_ev))
+        )
+        return f'TournamentResult: {self.games} games, {self.hands} hands\n{seats}'
+
+
+def shard_seed(seed, shard):
+    return int(np.random.SeedSequence([seed, shard]).generate_state(1)[0])
+
+
+def run_shard(lineup, stack, small_blind, games, seed):
+
+    # Every shard seeds its own table, so the outcome of a shard does not
+    # depend on which worker runs it or what ran there before
+    players = [cls(f'{cls.__name__}-{i}') for i, cls in enumerate(lineup)]
+    return simulate(players, stack, small_blind, games, seed)
+
+
+def run_tournaments(lineup, stack, small_blind, games, workers=None, seed=0, shard_size=50):
+
+    # lineup is a list of Player subclasses, one per seat
+    workers = workers or os.cpu_count()
+    shards = [(i, min(shard_size, games - start)) for i, start in enumerate(range(0, games, shard_size))]
+    result = TournamentResult(lineup)
+
+    if workers == 1:
+        for i, n in shards:
+            result.merge(run_shard(lineup, stack, small_blind, n, shard_seed(seed, i)))
+        return result
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_shard, lineup, stack, small_blind, n, shard_seed(seed, i)) for i, n in shards]
+        for f in futures:
+            result.merge(f.result())
+
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import Player
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lineup', nargs='*', default=['RandomPlayer', 'AgressivePlayer', 'SoftRandomPlayer', 'TightPlayer'])
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--stack', type=int, default=100)
+    parser.add_argument('--small-blind', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    lineup = [getattr(Player, name) for name in args.lineup]
+
+    start = time.perf_counter()
+    result = run_tournaments(lineup, args.stack, args.small_blind, args.games, args.workers, args.seed)
+    print(result)
+    print('elapsed', time.perf_counter() - start)